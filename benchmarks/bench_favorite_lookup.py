@@ -0,0 +1,76 @@
+"""
+Regression benchmark for the favorites detail routes.
+
+Seeds a throwaway SQLite database with increasingly large favorites tables
+and measures GET /favorites/planets/<id> against each of them. A primary key
+lookup should cost the same with 1k or 100k rows, so the script exits with a
+non-zero status when the largest table is more than MAX_SLOWDOWN times slower
+than the smallest one.
+
+    $ python benchmarks/bench_favorite_lookup.py
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DB_PATH
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sqlalchemy import insert, delete
+from wsgi import application as app
+from models import db, User, Planets, Favorites
+
+SIZES = [1000, 10000, 100000]
+REQUESTS = 200
+MAX_SLOWDOWN = 3.0
+
+def seed_favorites(size):
+    db.session.execute(delete(Favorites))
+    # a user favorites a planet once, so every favorite belongs to another user
+    db.session.execute(insert(Favorites), [
+        {"user_id": i + 1, "planet_id": 1} for i in range(size)
+    ])
+    db.session.commit()
+
+def measure(client, size):
+    ids = [random.randint(1, size) for _ in range(REQUESTS)]
+    start = time.perf_counter()
+    for id in ids:
+        response = client.get("/favorites/planets/" + str(id))
+        assert response.status_code == 200, response.status_code
+    return (time.perf_counter() - start) / REQUESTS * 1000
+
+def main():
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {"user_name": "bench%d" % i, "email": "bench%d@example.com" % i} for i in range(max(SIZES))
+        ])
+        db.session.execute(insert(Planets), [{
+            "url": "https://swapi.dev/api/planets/1/", "diameter": 10465,
+            "rotation_period": 23, "orbital_period": 304, "name": "Tatooine",
+            "terrain": "desert", "population": 200000, "gravity": "1 standard",
+            "climate": "arid",
+        }])
+        db.session.commit()
+
+        client = app.test_client()
+        results = []
+        for size in SIZES:
+            seed_favorites(size)
+            latency = measure(client, size)
+            results.append(latency)
+            print("%8d favorites: %.3f ms/request" % (size, latency))
+
+    slowdown = results[-1] / results[0]
+    print("slowdown %dx rows: %.2fx" % (SIZES[-1] // SIZES[0], slowdown))
+    if slowdown > MAX_SLOWDOWN:
+        print("FAIL: favorite lookup latency grows with table size")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
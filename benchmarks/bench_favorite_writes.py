@@ -0,0 +1,151 @@
+"""
+Write throughput of POST /favorites/planets/<id> with one commit per request
+versus the write-behind queue (FAVORITES_WRITE_BEHIND, see
+src/favorite_writer.py), under gunicorn threaded workers. Every request adds a
+new (user, planet) pair, so all of them are real inserts.
+
+    $ python benchmarks/bench_favorite_writes.py [--concurrency 32] [--seconds 10]
+    $ python benchmarks/bench_favorite_writes.py --database-url postgresql://localhost/bench
+
+Runs against a fresh SQLite file, plus every --database-url given. Those
+databases are dropped and recreated, only point it at a throwaway one.
+Prints one JSON document with requests per second and latency percentiles
+per database and mode.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import itertools
+import threading
+import subprocess
+import http.client
+
+from common import ROOT, SRC, summarize
+
+MODES = {
+    "direct": {"FAVORITES_WRITE_BEHIND": "false"},
+    "write_behind": {"FAVORITES_WRITE_BEHIND": "true"},
+}
+
+def prepare(database_url, users, planets):
+    script = (
+        "from wsgi import application as app\n"
+        "from models import db, User, Planets\n"
+        "from common import insert_chunks, planet_row\n"
+        "with app.app_context():\n"
+        "    db.drop_all()\n"
+        "    db.create_all()\n"
+        "    insert_chunks(User, %d, lambda i: {'user_name': 'user%%d' %% i, 'email': 'user%%d@example.com' %% i})\n"
+        "    insert_chunks(Planets, %d, planet_row)\n"
+    ) % (users, planets)
+    env = dict(os.environ, DATABASE_URL=database_url, ADMIN="false",
+               PYTHONPATH=os.pathsep.join([SRC, os.path.dirname(os.path.abspath(__file__))]))
+    subprocess.run([sys.executable, "-c", script], cwd=SRC, env=env, check=True)
+
+def clear(database_url):
+    script = (
+        "from sqlalchemy import text\n"
+        "from wsgi import application as app\n"
+        "from models import db\n"
+        "with app.app_context():\n"
+        "    db.session.execute(text('DELETE FROM favorites'))\n"
+        "    db.session.execute(text('DELETE FROM favorite_totals'))\n"
+        "    db.session.commit()\n"
+    )
+    env = dict(os.environ, DATABASE_URL=database_url, ADMIN="false")
+    subprocess.run([sys.executable, "-c", script], cwd=SRC, env=env, check=True)
+
+def start_server(database_url, port, workers, threads, mode):
+    env = dict(os.environ, DATABASE_URL=database_url, SERVER_MODE="wsgi", ADMIN="false",
+               PORT=str(port), WEB_CONCURRENCY=str(workers),
+               GUNICORN_CMD_ARGS="--threads %d" % threads, **MODES[mode])
+    process = subprocess.Popen(
+        ["gunicorn", "--config", "src/gunicorn.conf.py", "--chdir", "./src/"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health")
+            connection.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(mode + " server did not start")
+
+def drive(port, users, planets, concurrency, seconds):
+    pairs = itertools.count()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + seconds
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = []
+        while time.time() < stop_at:
+            with lock:
+                n = next(pairs)
+            if n >= users * planets:
+                break
+            body = json.dumps({"user_id": n // planets + 1})
+            start = time.perf_counter()
+            try:
+                connection.request("POST", "/favorites/planets/%d" % (n % planets + 1), body,
+                                   {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 201:
+                    errors[0] += 1
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, seconds, errors[0])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", action="append", default=[],
+                        help="extra database to run against, e.g. Postgres (dropped and recreated)")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--planets", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=16, help="gunicorn threads per worker")
+    parser.add_argument("--port", type=int, default=5841)
+    args = parser.parse_args()
+
+    databases = ["sqlite:///" + os.path.join(tempfile.mkdtemp(), "writes.db")] + args.database_url
+    report = {"concurrency": args.concurrency, "workers": args.workers, "threads": args.threads, "results": {}}
+    for database_url in databases:
+        dialect = database_url.split(":", 1)[0].split("+", 1)[0]
+        prepare(database_url, args.users, args.planets)
+        report["results"][dialect] = {}
+        for mode in MODES:
+            clear(database_url)
+            server = start_server(database_url, args.port, args.workers, args.threads, mode)
+            try:
+                report["results"][dialect][mode] = drive(args.port, args.users, args.planets,
+                                                         args.concurrency, args.seconds)
+            finally:
+                server.terminate()
+                server.wait()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Benchmark suite for every route in src/app.py.
+
+Builds a SQLite database with the real migrations, seeds it with the
+requested volumes and drives every route, first in-process through the Flask
+test client and then over HTTP against a local gunicorn. Reports p50/p95/p99
+latency, requests per second and peak RSS per route as JSON.
+
+    $ python benchmarks/bench_routes.py --favorites 100000 --requests 200 --output bench.json
+
+Routes registered in the app but missing from ROUTES are listed under
+"uncovered" so new endpoints do not silently skip benchmarking.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import itertools
+import tempfile
+import threading
+import subprocess
+import http.client
+import resource
+
+from common import ROOT, SRC, MIGRATIONS, seed, summarize, peak_rss_kb, child_pids, planet_row, character_row, vehicle_row
+
+class Ids:
+    """
+    Reads pick random ids from the lower half of a table, deletes take ids
+    from the top down, so reads never hit rows a delete already removed.
+    """
+    def __init__(self, count, step=1, offset=1):
+        self.count = count
+        self.step = step
+        self.offset = offset
+        self.next_delete = (count - offset) // step
+
+    def read(self):
+        return random.randint(0, max(0, (self.count - self.offset) // self.step // 2)) * self.step + self.offset
+
+    def delete(self):
+        id = self.next_delete * self.step + self.offset
+        self.next_delete -= 1
+        return id
+
+def build_routes(volumes, requests):
+    """(name, url rule, method, path factory, json body factory)"""
+    planets = Ids(volumes["planets"])
+    characters = Ids(volumes["characters"])
+    vehicles = Ids(volumes["vehicles"])
+    # seeded favorites are planet, character, vehicle round robin (see common.seed)
+    favorite_planets = Ids(volumes["favorites"], 3, 1)
+    favorite_characters = Ids(volumes["favorites"], 3, 2)
+    favorite_vehicles = Ids(volumes["favorites"], 3, 3)
+    favorites = Ids(volumes["favorites"])
+    # below the ids the typed deletes take from the top, above the ones reads pick
+    favorites.next_delete = volumes["favorites"] - 3 * requests - 1
+    user = lambda: {"user_id": random.randint(1, volumes["users"])}
+    # favorites are unique per user and item: new favorites go to the first user POST /users
+    # created, which has none yet, each for a different item
+    new_user = lambda: {"user_id": volumes["users"] + 1}
+    new_favorites = dict((type, itertools.count(1)) for type in ("planets", "characters", "vehicles"))
+    created_favorites = itertools.count(volumes["favorites"] + 1)
+    # urls are unique, created rows are numbered after the seeded ones
+    serial = itertools.count(10 ** 7)
+
+    return [
+        ("GET /", "/", "GET", lambda: "/", None),
+        ("GET /users", "/users", "GET", lambda: "/users", None),
+        ("GET /users?expand=favorites", "/users", "GET", lambda: "/users?expand=favorites", None),
+        ("GET /users/<id>/favorites", "/users/<int:user_id>/favorites", "GET",
+         lambda: "/users/%d/favorites" % user()["user_id"], None),
+        ("GET /users/<id>/favorites?expand=1", "/users/<int:user_id>/favorites", "GET",
+         lambda: "/users/%d/favorites?expand=1" % user()["user_id"], None),
+        ("POST /users", "/users", "POST", lambda: "/users",
+         lambda: {"user_name": "bench", "email": "bench@example.com"}),
+        ("GET /planets", "/planets", "GET", lambda: "/planets", None),
+        ("GET /planets?climate=arid&sort=-population", "/planets", "GET",
+         lambda: "/planets?climate=arid&sort=-population", None),
+        ("GET /planets?fields=name", "/planets", "GET", lambda: "/planets?fields=name", None),
+        ("GET /planets?ids=", "/planets", "GET",
+         lambda: "/planets?ids=" + ",".join(str(planets.read()) for _ in range(20)), None),
+        ("POST /planets", "/planets", "POST", lambda: "/planets", lambda: planet_row(next(serial))),
+        ("GET /characters", "/characters", "GET", lambda: "/characters", None),
+        ("POST /characters", "/characters", "POST", lambda: "/characters", lambda: character_row(next(serial))),
+        ("GET /vehicles", "/vehicles", "GET", lambda: "/vehicles", None),
+        ("POST /vehicles", "/vehicles", "POST", lambda: "/vehicles", lambda: vehicle_row(next(serial))),
+        ("POST /planets/bulk", "/planets/bulk", "POST", lambda: "/planets/bulk",
+         lambda: [planet_row(next(serial)) for _ in range(100)]),
+        ("POST /characters/bulk", "/characters/bulk", "POST", lambda: "/characters/bulk",
+         lambda: [character_row(next(serial)) for _ in range(100)]),
+        ("POST /vehicles/bulk", "/vehicles/bulk", "POST", lambda: "/vehicles/bulk",
+         lambda: [vehicle_row(next(serial)) for _ in range(100)]),
+        ("POST /planets/sync", "/planets/sync", "POST", lambda: "/planets/sync",
+         lambda: [planet_row(random.randint(1, volumes["planets"])) for _ in range(100)]),
+        ("POST /characters/sync", "/characters/sync", "POST", lambda: "/characters/sync",
+         lambda: [character_row(random.randint(1, volumes["characters"])) for _ in range(100)]),
+        ("POST /vehicles/sync", "/vehicles/sync", "POST", lambda: "/vehicles/sync",
+         lambda: [vehicle_row(random.randint(1, volumes["vehicles"])) for _ in range(100)]),
+        ("GET /search", "/search", "GET", lambda: "/search?q=planet+%d" % random.randint(1, 99), None),
+        ("GET /health", "/health", "GET", lambda: "/health", None),
+        ("GET /cache/stats", "/cache/stats", "GET", lambda: "/cache/stats", None),
+        ("GET /planets/<id>", "/planets/<int:planet_id>", "GET", lambda: "/planets/%d" % planets.read(), None),
+        ("GET /characters/<id>", "/characters/<int:character_id>", "GET",
+         lambda: "/characters/%d" % characters.read(), None),
+        ("GET /vehicles/<id>", "/vehicles/<int:vehicle_id>", "GET", lambda: "/vehicles/%d" % vehicles.read(), None),
+        ("GET /favorites", "/favorites", "GET", lambda: "/favorites", None),
+        ("GET /favorites?user_id=", "/favorites", "GET",
+         lambda: "/favorites?user_id=%d" % user()["user_id"], None),
+        ("GET /favorites/planets", "/favorites/planets", "GET", lambda: "/favorites/planets", None),
+        ("GET /favorites/characters", "/favorites/characters", "GET", lambda: "/favorites/characters", None),
+        ("GET /favorites/vehicles", "/favorites/vehicles", "GET", lambda: "/favorites/vehicles", None),
+        ("GET /favorites/top", "/favorites/top", "GET", lambda: "/favorites/top?type=planet", None),
+        ("GET /favorites/planets/<id>", "/favorites/planets/<int:id>", "GET",
+         lambda: "/favorites/planets/%d" % favorite_planets.read(), None),
+        ("GET /favorites/characters/<id>", "/favorites/characters/<int:id>", "GET",
+         lambda: "/favorites/characters/%d" % favorite_characters.read(), None),
+        ("GET /favorites/vehicles/<id>", "/favorites/vehicles/<int:id>", "GET",
+         lambda: "/favorites/vehicles/%d" % favorite_vehicles.read(), None),
+        ("POST /favorites/planets/<id>", "/favorites/planets/<int:planet_id>", "POST",
+         lambda: "/favorites/planets/%d" % next(new_favorites["planets"]), new_user),
+        ("POST /favorites/characters/<id>", "/favorites/characters/<int:character_id>", "POST",
+         lambda: "/favorites/characters/%d" % next(new_favorites["characters"]), new_user),
+        ("POST /favorites/vehicles/<id>", "/favorites/vehicles/<int:vehicle_id>", "POST",
+         lambda: "/favorites/vehicles/%d" % next(new_favorites["vehicles"]), new_user),
+        ("DELETE /favorites/planets/<id>", "/favorites/planets/<int:id>", "DELETE",
+         lambda: "/favorites/planets/%d" % favorite_planets.delete(), None),
+        ("DELETE /favorites/characters/<id>", "/favorites/characters/<int:id>", "DELETE",
+         lambda: "/favorites/characters/%d" % favorite_characters.delete(), None),
+        ("DELETE /favorites/vehicles/<id>", "/favorites/vehicles/<int:id>", "DELETE",
+         lambda: "/favorites/vehicles/%d" % favorite_vehicles.delete(), None),
+        ("DELETE /favorites/<id>", "/favorites/<int:id>", "DELETE",
+         lambda: "/favorites/%d" % favorites.delete(), None),
+        # the POST /favorites/<type>/<id> routes above created ids after the seeded ones for new_user
+        ("DELETE /users/<id>/favorites/<id>", "/users/<int:user_id>/favorites/<int:favorite_id>", "DELETE",
+         lambda: "/users/%d/favorites/%d" % (new_user()["user_id"], next(created_favorites)), None),
+        ("DELETE /planets/<id>", "/planets/<int:planet_id>", "DELETE", lambda: "/planets/%d" % planets.delete(), None),
+        ("DELETE /characters/<id>", "/characters/<int:character_id>", "DELETE",
+         lambda: "/characters/%d" % characters.delete(), None),
+        ("DELETE /vehicles/<id>", "/vehicles/<int:vehicle_id>", "DELETE",
+         lambda: "/vehicles/%d" % vehicles.delete(), None),
+    ]
+
+def uncovered_rules(app, routes):
+    covered = set((rule, method) for _, rule, method, _, _ in routes)
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.rule.startswith("/admin") or rule.endpoint == "static":
+            continue
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            if (rule.rule, method) not in covered:
+                missing.append(method + " " + rule.rule)
+    return missing
+
+def run_client(app, routes, requests):
+    client = app.test_client()
+    results = {}
+    for name, _, method, path, body in routes:
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            url = path()
+            payload = body() if body is not None else None
+            start = time.perf_counter()
+            response = client.open(url, method=method, json=payload)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+        results[name] = summarize(latencies, time.perf_counter() - started, errors)
+        # ru_maxrss is in kilobytes on Linux and only ever grows
+        results[name]["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+def start_gunicorn(database_url, port, workers):
+    env = dict(os.environ, DATABASE_URL=database_url, PORT=str(port), WEB_CONCURRENCY=str(workers))
+    process = subprocess.Popen(
+        ["gunicorn", "--config", "src/gunicorn.conf.py", "--chdir", "./src/"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health")
+            connection.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+def run_gunicorn(process, port, routes, requests, concurrency):
+    results = {}
+    lock = threading.Lock()
+    for name, _, method, path, body in routes:
+        # build the requests up front, the id pickers are not thread safe
+        work = []
+        for _ in range(requests):
+            work.append((path(), json.dumps(body()) if body is not None else None))
+        latencies = []
+        errors = [0]
+
+        def client():
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            while True:
+                with lock:
+                    if not work:
+                        return
+                    url, payload = work.pop()
+                headers = {"Content-Type": "application/json"} if payload is not None else {}
+                start = time.perf_counter()
+                try:
+                    connection.request(method, url, body=payload, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    failed = response.status >= 400
+                except (OSError, http.client.HTTPException):
+                    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                    failed = True
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    errors[0] += failed
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[name] = summarize(latencies, time.perf_counter() - started, errors[0])
+        workers = child_pids(process.pid)
+        results[name]["peak_rss_kb"] = max([peak_rss_kb(pid) or 0 for pid in workers] or [0])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--planets", type=int, default=10000)
+    parser.add_argument("--characters", type=int, default=10000)
+    parser.add_argument("--vehicles", type=int, default=10000)
+    parser.add_argument("--favorites", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=100, help="requests per route")
+    parser.add_argument("--mode", choices=["client", "gunicorn", "both"], default="both")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=5821)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    volumes = {
+        "users": args.users, "planets": args.planets, "characters": args.characters,
+        "vehicles": args.vehicles, "favorites": args.favorites,
+    }
+    directory = tempfile.mkdtemp()
+    client_db = os.path.join(directory, "client.db")
+    server_db = os.path.join(directory, "server.db")
+    os.environ["DATABASE_URL"] = "sqlite:///" + client_db
+    sys.path.insert(0, SRC)
+
+    from flask_migrate import Migrate, upgrade
+    from sqlalchemy import text
+    from wsgi import application as app
+    from models import db
+
+    Migrate(app, db)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        started = time.perf_counter()
+        seed(volumes)
+        seed_seconds = time.perf_counter() - started
+        db.session.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        db.session.commit()
+        db.engine.dispose()
+    shutil.copy(client_db, server_db)
+
+    report = {
+        "volumes": volumes,
+        "requests_per_route": args.requests,
+        "seed_seconds": round(seed_seconds, 2),
+        "results": {},
+        "uncovered": uncovered_rules(app, build_routes(volumes, args.requests)),
+    }
+    if args.mode in ("client", "both"):
+        with app.app_context():
+            report["results"]["client"] = run_client(app, build_routes(volumes, args.requests), args.requests)
+    if args.mode in ("gunicorn", "both"):
+        process = start_gunicorn("sqlite:///" + server_db, args.port, args.workers)
+        try:
+            report["results"]["gunicorn"] = run_gunicorn(process, args.port, build_routes(volumes, args.requests),
+                                                         args.requests, args.concurrency)
+        finally:
+            process.terminate()
+            process.wait()
+        report["gunicorn"] = {"workers": args.workers, "concurrency": args.concurrency,
+                              "server_mode": os.getenv("SERVER_MODE", "wsgi")}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
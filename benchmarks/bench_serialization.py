@@ -0,0 +1,94 @@
+"""
+Compares the list endpoints' old read path, ORM instances serialized one by
+one with serialize() and encoded by Flask's json module provider, with the
+Core row path in src/rows.py encoded by FastJSONProvider (orjson when it is
+installed). Every combination of the two row paths and two encoders is timed
+on pages of increasing size, plus the GET /planets route end to end for
+pages up to PAGE_SIZE_MAX.
+
+    $ python benchmarks/bench_serialization.py --rows 10000 --output serialization.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DB_PATH
+os.environ["CACHE_BACKEND"] = "none"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+from wsgi import application as app
+from models import db, Planets
+from rows import select_columns
+from pagination import MAX_PAGE_SIZE
+from encoding import FastJSONProvider, orjson
+from common import insert_chunks, planet_row, percentile
+
+PAGE_SIZES = [100, 1000, 10000]
+
+def orm_rows(limit):
+    planets = db.session.execute(select(Planets).order_by(Planets.id).limit(limit)).scalars().all()
+    return [planet.serialize() for planet in planets]
+
+def core_rows(limit):
+    names, columns = select_columns(Planets)
+    rows = db.session.execute(select(*columns).order_by(Planets.id).limit(limit)).all()
+    return [dict(zip(names, row)) for row in rows]
+
+def measure(rows, provider, limit, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        provider.dumps({"results": rows(limit), "next": None}, separators=(",", ":"))
+        timings.append((time.perf_counter() - start) * 1000)
+        # drop the identity map so every ORM run hydrates fresh instances
+        db.session.remove()
+    return {"p50_ms": round(percentile(timings, 0.5), 3), "p95_ms": round(percentile(timings, 0.95), 3)}
+
+def measure_route(client, limit, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get("/planets?limit=%d" % limit)
+        assert response.status_code == 200, response.status_code
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(percentile(timings, 0.5), 3), "p95_ms": round(percentile(timings, 0.95), 3)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    encoders = {"stdlib": DefaultJSONProvider(app), "fast": FastJSONProvider(app)}
+    row_paths = {"orm_serialize": orm_rows, "core_rows": core_rows}
+    report = {"rows": args.rows, "orjson": orjson is not None, "pages": {}}
+
+    with app.app_context():
+        db.create_all()
+        insert_chunks(Planets, args.rows, planet_row)
+        client = app.test_client()
+        for size in [size for size in PAGE_SIZES if size <= args.rows]:
+            page = {}
+            for row_name, rows in row_paths.items():
+                for encoder_name, provider in encoders.items():
+                    page[row_name + "+" + encoder_name] = measure(rows, provider, size, args.repeat)
+            if size <= MAX_PAGE_SIZE:
+                page["GET /planets"] = measure_route(client, size, args.repeat)
+            report["pages"][size] = page
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
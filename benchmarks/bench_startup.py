@@ -0,0 +1,121 @@
+"""
+Startup cost of the app: how long `import wsgi` takes in a fresh interpreter
+and how much memory it leaves behind, then how long gunicorn needs until
+every worker is up, with and without GUNICORN_PRELOAD and ADMIN. Worker
+memory is reported as RSS and as PSS, which splits pages shared with the
+master (preload) between the processes sharing them.
+
+    $ python benchmarks/bench_startup.py --workers 4 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import http.client
+
+from common import ROOT, SRC, child_pids
+
+IMPORT_SCRIPT = (
+    "import time, resource\n"
+    "start = time.perf_counter()\n"
+    "import wsgi\n"
+    "seconds = time.perf_counter() - start\n"
+    "print(seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+)
+
+CONFIGURATIONS = [
+    {"ADMIN": "true", "GUNICORN_PRELOAD": "false"},
+    {"ADMIN": "false", "GUNICORN_PRELOAD": "false"},
+    {"ADMIN": "false", "GUNICORN_PRELOAD": "true"},
+]
+
+def memory_kb(pid, field):
+    # Rss and Pss from smaps_rollup (Linux only)
+    try:
+        with open("/proc/%d/smaps_rollup" % pid) as smaps:
+            for line in smaps:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def measure_import(env, repeat):
+    seconds = []
+    rss = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT], cwd=SRC, env=env,
+                                         stderr=subprocess.DEVNULL)
+        elapsed, maxrss = output.split()
+        seconds.append(float(elapsed))
+        rss.append(int(maxrss))
+    return {"import_ms": round(statistics.median(seconds) * 1000, 1), "max_rss_kb": max(rss)}
+
+def health(port):
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+        connection.request("GET", "/health")
+        return connection.getresponse().status == 200
+    except OSError:
+        return False
+
+def measure_gunicorn(env, port, workers):
+    env = dict(env, PORT=str(port), WEB_CONCURRENCY=str(workers))
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        ["gunicorn", "--config", "src/gunicorn.conf.py", "--chdir", "./src/"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            # the master forks the workers one after the other, wait for all of them
+            if len(child_pids(process.pid)) == workers and health(port):
+                break
+            time.sleep(0.02)
+        else:
+            raise RuntimeError("gunicorn did not start")
+        boot = time.perf_counter() - start
+        # one request per worker is not guaranteed, so give the others a moment to finish booting
+        time.sleep(1)
+        pids = child_pids(process.pid)
+        return {
+            "boot_ms": round(boot * 1000, 1),
+            "master_rss_kb": memory_kb(process.pid, "Rss"),
+            "worker_rss_kb": [memory_kb(pid, "Rss") for pid in pids],
+            "worker_pss_kb": [memory_kb(pid, "Pss") for pid in pids],
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import measurement")
+    parser.add_argument("--port", type=int, default=5831)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db")
+    report = {"workers": args.workers, "results": []}
+    for configuration in CONFIGURATIONS:
+        env = dict(os.environ, DATABASE_URL=database_url, **configuration)
+        result = dict(configuration)
+        result.update(measure_import(env, args.repeat))
+        result.update(measure_gunicorn(env, args.port, args.workers))
+        report["results"].append(result)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Concurrent read throughput of the two serving modes against the same SQLite
+file: gunicorn sync workers running wsgi.py versus uvicorn workers running
+asgi.py (see src/gunicorn.conf.py). Both get the same number of workers.
+
+    $ python benchmarks/bench_sync_vs_async.py [--rows 5000] [--concurrency 32] [--seconds 10]
+
+Prints one JSON document with requests per second and latency percentiles
+for every mode and path.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PATHS = ["/planets?limit=50", "/planets/{id}", "/characters/{id}"]
+
+def seed(database_url, rows):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    script = (
+        "from sqlalchemy import insert\n"
+        "from wsgi import application as app\n"
+        "from models import db, Planets, Characters\n"
+        "with app.app_context():\n"
+        "    db.create_all()\n"
+        "    db.session.execute(insert(Planets), [dict(url='https://swapi.dev/api/planets/%d/' % i, diameter=i, rotation_period=24, orbital_period=365, name='Planet %d' % i, terrain='desert', population=i * 1000, gravity='1 standard', climate='arid') for i in range(" + str(rows) + ")])\n"
+        "    db.session.execute(insert(Characters), [dict(url='https://swapi.dev/api/people/%d/' % i, name='Character %d' % i, hair_color='blond', skin_color='fair', eye_color='blue', birth_year='19BBY', height=172, mass=77, gender='male') for i in range(" + str(rows) + ")])\n"
+        "    db.session.commit()\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=os.path.join(ROOT, "src"), env=env, check=True)
+
+def start_server(mode, database_url, port, workers):
+    env = dict(os.environ, DATABASE_URL=database_url, SERVER_MODE=mode, CACHE_BACKEND="none",
+               PORT=str(port), WEB_CONCURRENCY=str(workers))
+    process = subprocess.Popen(
+        ["gunicorn", "--config", "src/gunicorn.conf.py", "--chdir", "./src/"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health")
+            connection.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(mode + " server did not start")
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def drive(port, path, rows, concurrency, seconds):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + seconds
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = []
+        while time.time() < stop_at:
+            url = path.replace("{id}", str(random.randint(1, rows)))
+            start = time.perf_counter()
+            try:
+                connection.request("GET", url)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[0] += 1
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99), 2) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    seed(database_url, args.rows)
+
+    report = {"rows": args.rows, "concurrency": args.concurrency, "workers": args.workers, "modes": {}}
+    for port, mode in ((5811, "wsgi"), (5812, "asgi")):
+        server = start_server(mode, database_url, port, args.workers)
+        try:
+            report["modes"][mode] = {}
+            for path in PATHS:
+                report["modes"][mode][path] = drive(port, path, args.rows, args.concurrency, args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
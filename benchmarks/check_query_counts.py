@@ -0,0 +1,68 @@
+"""
+Counts the SQL statements issued per request so N+1 regressions are caught
+before they ship. Every check seeds a throwaway SQLite database and compares
+the number of statements against a fixed budget that must not grow with the
+number of rows returned.
+
+    $ python benchmarks/check_query_counts.py
+"""
+import os
+import sys
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DB_PATH
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sqlalchemy import event, insert
+from wsgi import application as app
+from models import db, User, Planets, Favorites
+
+USERS = 50
+
+# path -> maximum number of statements for a single request, including the
+# table_versions read behind the ETag (see versions.py)
+BUDGETS = {
+    "/users": 2,
+    "/users?expand=favorites": 3,
+}
+
+def seed():
+    db.session.execute(insert(User), [
+        {"user_name": "user" + str(i), "email": "user%d@example.com" % i} for i in range(USERS)
+    ])
+    db.session.execute(insert(Planets), [{
+        "url": "https://swapi.dev/api/planets/1/", "diameter": 10465,
+        "rotation_period": 23, "orbital_period": 304, "name": "Tatooine",
+        "terrain": "desert", "population": 200000, "gravity": "1 standard",
+        "climate": "arid",
+    }])
+    db.session.execute(insert(Favorites), [
+        {"user_id": i + 1, "planet_id": 1} for i in range(USERS)
+    ])
+    db.session.commit()
+
+def main():
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        seed()
+        event.listen(db.engine, "before_cursor_execute", count)
+        client = app.test_client()
+        for path, budget in BUDGETS.items():
+            del statements[:]
+            response = client.get(path)
+            assert response.status_code == 200, response.status_code
+            status = "ok" if len(statements) <= budget else "FAIL"
+            if status == "FAIL":
+                failures += 1
+            print("%-4s %-30s %d statements (budget %d)" % (status, path, len(statements), budget))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
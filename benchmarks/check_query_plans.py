@@ -0,0 +1,76 @@
+"""
+Runs the list routes with filters and sorts, captures the SQL they send and
+checks with SQLite's EXPLAIN QUERY PLAN that each one is answered from the
+expected index instead of a full table scan.
+
+    $ python benchmarks/check_query_plans.py
+"""
+import os
+import sys
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DB_PATH
+os.environ["CACHE_BACKEND"] = "none"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sqlalchemy import event, insert
+from wsgi import application as app
+from models import db, User
+
+# path -> (table, index the query has to use)
+CASES = {
+    "/planets?climate=arid": ("planets", "ix_planets_climate_id"),
+    "/planets?terrain__in=desert,jungle": ("planets", "ix_planets_terrain_id"),
+    "/planets?population__gte=1000&sort=population": ("planets", "ix_planets_population_id"),
+    "/planets?sort=-diameter": ("planets", "ix_planets_diameter_id"),
+    "/characters?gender=female": ("characters", "ix_characters_gender_id"),
+    "/characters?eye_color=blue&sort=name": ("characters", "ix_characters_eye_color_id"),
+    "/vehicles?manufacturer=Incom": ("vehicles", "ix_vehicles_manufacturer_id"),
+    "/vehicles?cost_in_credits__lt=10000&sort=cost_in_credits": ("vehicles", "ix_vehicles_cost_in_credits_id"),
+    "/vehicles?crew__gte=2&sort=-crew": ("vehicles", "ix_vehicles_crew_id"),
+    "/users/1/favorites": ("favorites", "ix_favorites_user_id_id_planet_id_character_id_vehicle_id"),
+}
+
+def main():
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        # /users/<id>/favorites answers 404 for a missing user
+        db.session.execute(insert(User), [{"user_name": "user1", "email": "user1@example.com"}])
+        db.session.commit()
+        event.listen(db.engine, "before_cursor_execute", capture)
+        client = app.test_client()
+        for path, (table, index) in CASES.items():
+            del captured[:]
+            response = client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+            statements = [item for item in captured if "FROM " + table in item[0]]
+            event.remove(db.engine, "before_cursor_execute", capture)
+
+            plan = []
+            connection = db.engine.raw_connection()
+            try:
+                for statement, parameters in statements:
+                    for row in connection.execute("EXPLAIN QUERY PLAN " + statement, parameters):
+                        plan.append(row[3])
+            finally:
+                connection.close()
+            event.listen(db.engine, "before_cursor_execute", capture)
+
+            full_scan = [line for line in plan if line.startswith("SCAN " + table) and "USING" not in line]
+            ok = statements and not full_scan and any(index in line for line in plan)
+            if not ok:
+                failures += 1
+            print("%-4s %s" % ("ok" if ok else "FAIL", path))
+            for line in plan:
+                print("       " + line)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Checks the read replica routing of replicas.py and the asgi.py fast path
+with two SQLite files standing in for the primary and a replica that lags
+behind it: anonymous reads are served by the replica, a client that just
+wrote reads from the primary, and reads fall back to the primary when the
+replica can not be reached.
+
+    $ python benchmarks/check_replicas.py
+"""
+import os
+import sys
+import shutil
+import asyncio
+import tempfile
+
+DIRECTORY = tempfile.mkdtemp()
+PRIMARY_PATH = os.path.join(DIRECTORY, "primary.db")
+# removing the directory makes the replica impossible to open, like a server that is down
+REPLICA_DIRECTORY = os.path.join(DIRECTORY, "replica")
+REPLICA_PATH = os.path.join(REPLICA_DIRECTORY, "replica.db")
+os.makedirs(REPLICA_DIRECTORY)
+os.environ["DATABASE_URL"] = "sqlite:///" + PRIMARY_PATH
+os.environ["DATABASE_READ_URL"] = "sqlite:///" + REPLICA_PATH
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["ADMIN"] = "false"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sqlalchemy import event, insert, text
+from wsgi import application as app
+from models import db, User, Planets
+import asgi
+import replicas
+
+NAMES = {PRIMARY_PATH: "primary", REPLICA_PATH: "replica"}
+
+def planet_row(i):
+    return {
+        "url": "https://swapi.dev/api/planets/%d/" % i, "diameter": 10465,
+        "rotation_period": 23, "orbital_period": 304, "name": "Planet %d" % i,
+        "terrain": "desert", "population": 200000, "gravity": "1 standard", "climate": "arid",
+    }
+
+def seed():
+    """One user and one planet on both databases, a second of each on the primary only."""
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [{"user_name": "user1", "email": "user1@example.com"}])
+        db.session.execute(insert(Planets), [planet_row(1)])
+        db.session.commit()
+        db.session.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        for engine in db.engines.values():
+            engine.dispose()
+        shutil.copy(PRIMARY_PATH, REPLICA_PATH)
+        # no request context, so these go to the primary
+        db.session.execute(insert(User), [{"user_name": "user2", "email": "user2@example.com"}])
+        db.session.execute(insert(Planets), [planet_row(2)])
+        db.session.commit()
+
+async def call_asgi(path, headers=()):
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": list(headers)}
+    response = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        else:
+            response["body"] = message.get("body", b"")
+    await asgi.application(scope, receive, send)
+    return response
+
+def asgi_get(path, headers=()):
+    response = asyncio.run(call_asgi(path, headers))
+    return response["status"], app.json.loads(response["body"])
+
+def flask_get(client, path):
+    response = client.get(path)
+    return response.status_code, response.get_json()
+
+def main():
+    seed()
+    served = set()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        served.add(NAMES[conn.engine.url.database])
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    engines += [asgi.engine.sync_engine] + [engine.sync_engine for engine in asgi.replica_engines.values()]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", capture)
+
+    writer = app.test_client()
+    pin = [(b"cookie", replicas.PIN_COOKIE.encode() + b"=1")]
+
+    def write():
+        response = writer.post("/users", json={"user_name": "user3", "email": "user3@example.com"})
+        assert response.status_code == 201, response.status_code
+        assert writer.get_cookie(replicas.PIN_COOKIE) is not None, "no pin cookie after a write"
+
+    def kill_replica():
+        shutil.rmtree(REPLICA_DIRECTORY)
+        with app.app_context():
+            db.engines[replicas.REPLICA_KEYS[0]].dispose()
+        for engine in asgi.replica_engines.values():
+            asyncio.run(engine.dispose())
+
+    def revive_check():
+        # every check starts with no replica marked down, so each one exercises the fallback
+        replicas.down_until.clear()
+
+    # name, setup, read, expected database, expected number of results
+    checks = [
+        ("anonymous GET /users reads the replica", None,
+         lambda: flask_get(app.test_client(), "/users"), "replica", 1),
+        ("anonymous asgi GET /planets reads the replica", None,
+         lambda: asgi_get("/planets"), "replica", 1),
+        ("GET /users after a write reads the primary", write,
+         lambda: flask_get(writer, "/users"), "primary", 3),
+        ("asgi GET /planets after a write reads the primary", None,
+         lambda: asgi_get("/planets", pin), "primary", 2),
+        ("GET /users falls back to the primary when the replica is down", kill_replica,
+         lambda: flask_get(app.test_client(), "/users"), "primary", 3),
+        ("asgi GET /planets falls back to the primary when the replica is down", revive_check,
+         lambda: asgi_get("/planets"), "primary", 2),
+    ]
+
+    failures = 0
+    for name, setup, read, database, count in checks:
+        if setup is not None:
+            setup()
+        served.clear()
+        status, body = read()
+        results = len(body["results"]) if status == 200 else None
+        ok = status == 200 and served == {database} and results == count
+        if not ok:
+            failures += 1
+        print("%-4s %s (status %d, read from %s, %s results)"
+              % ("ok" if ok else "FAIL", name, status, ", ".join(sorted(served)) or "-", results))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Checks POST /planets/sync against a throwaway SQLite database: new urls are
+inserted, a repeated import changes nothing, changed rows are updated, and
+an invalid record (e.g. an integer beyond 64 bits) is reported in "errors"
+while the rest of the import is still applied.
+
+    $ python benchmarks/check_sync.py
+"""
+import os
+import sys
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "sync.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DB_PATH
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["ADMIN"] = "false"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from wsgi import application as app
+from models import db
+
+def planet(i, **values):
+    row = {
+        "url": "https://swapi.dev/api/planets/%d/" % i, "diameter": 10465,
+        "rotation_period": 23, "orbital_period": 304, "name": "Planet %d" % i,
+        "terrain": "desert", "population": 200000, "gravity": "1 standard", "climate": "arid",
+    }
+    row.update(values)
+    return row
+
+# name, records, expected status, expected counts, indexes expected in "errors"
+CHECKS = [
+    ("new urls are inserted", [planet(1), planet(2)],
+     200, {"inserted": 2, "updated": 0, "unchanged": 0, "failed": 0}, []),
+    ("a repeated import changes nothing", [planet(1), planet(2)],
+     200, {"inserted": 0, "updated": 0, "unchanged": 2, "failed": 0}, []),
+    ("changed rows are updated", [planet(1, population=1), planet(2)],
+     200, {"inserted": 0, "updated": 1, "unchanged": 1, "failed": 0}, []),
+    ("an integer beyond 64 bits is a row error", [planet(3, population=10 ** 20), planet(4)],
+     207, {"inserted": 1, "updated": 0, "unchanged": 0, "failed": 1}, [0]),
+    ("a missing column is a row error", [planet(5, name=None), planet(1, population=2)],
+     207, {"inserted": 0, "updated": 1, "unchanged": 0, "failed": 1}, [0]),
+]
+
+def main():
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    failures = 0
+    for name, records, status, counts, errors in CHECKS:
+        response = client.post("/planets/sync", json=records)
+        body = response.get_json() or {}
+        actual = dict((key, body.get(key)) for key in counts)
+        indexes = [error["index"] for error in body.get("errors", [])]
+        ok = response.status_code == status and actual == counts and indexes == errors
+        if not ok:
+            failures += 1
+        print("%-4s %s (status %d, %s, errors at %s)"
+              % ("ok" if ok else "FAIL", name, response.status_code, actual, indexes))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Helpers shared by the benchmark scripts: seeding a database with realistic
+volumes and summarizing latencies.
+"""
+import os
+import random
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+SRC = os.path.join(ROOT, "src")
+MIGRATIONS = os.path.join(ROOT, "migrations")
+
+FAVORITE_TYPES = ("planet", "character", "vehicle")
+CHUNK = 5000
+
+def planet_row(i):
+    return {
+        "url": "https://swapi.dev/api/planets/%d/" % i, "diameter": random.randint(0, 200000),
+        "rotation_period": random.randint(10, 40), "orbital_period": random.randint(100, 5000),
+        "name": "Planet %d" % i, "terrain": random.choice(["desert", "jungle", "ocean", "tundra"]),
+        "population": random.randint(0, 10 ** 9), "gravity": "1 standard",
+        "climate": random.choice(["arid", "temperate", "frozen", "murky"]),
+    }
+
+def character_row(i):
+    return {
+        "url": "https://swapi.dev/api/people/%d/" % i, "name": "Character %d" % i,
+        "hair_color": random.choice(["blond", "brown", "black", "none"]), "skin_color": "fair",
+        "eye_color": random.choice(["blue", "brown", "yellow", "red"]), "birth_year": "19BBY",
+        "height": random.randint(60, 260), "mass": random.randint(20, 1400),
+        "gender": random.choice(["male", "female", "n/a"]),
+    }
+
+def vehicle_row(i):
+    return {
+        "url": "https://swapi.dev/api/vehicles/%d/" % i, "name": "Vehicle %d" % i,
+        "vehicle_class": random.choice(["wheeled", "repulsorcraft", "starfighter"]),
+        "manufacturer": random.choice(["Incom Corporation", "Corellia Mining Corporation", "Kuat Drive Yards"]),
+        "model": "Model %d" % i, "crew": random.randint(1, 50), "cost_in_credits": random.randint(1000, 10 ** 7),
+        "length": round(random.uniform(2, 200), 1), "passengers": random.randint(0, 100),
+        "max_atmosphering_speed": random.randint(100, 1500), "cargo_capacity": random.randint(0, 100000),
+        "consumables": "1 month",
+    }
+
+def favorite_type(favorite_id):
+    # favorites are seeded round robin, so the type can be derived from the id
+    return FAVORITE_TYPES[(favorite_id - 1) % 3]
+
+def insert_chunks(model, count, factory):
+    from sqlalchemy import insert
+    from models import db
+    for start in range(0, count, CHUNK):
+        rows = [factory(i) for i in range(start + 1, min(count, start + CHUNK) + 1)]
+        db.session.execute(insert(model), rows)
+        db.session.commit()
+
+def seed(volumes):
+    """
+    Seeds the database of the current app context. volumes is a dict with
+    users, planets, characters, vehicles and favorites counts.
+    """
+    from sqlalchemy import text
+    from models import db, User, Planets, Characters, Vehicles, Favorites
+
+    insert_chunks(User, volumes["users"], lambda i: {"user_name": "user%d" % i, "email": "user%d@example.com" % i})
+    insert_chunks(Planets, volumes["planets"], planet_row)
+    insert_chunks(Characters, volumes["characters"], character_row)
+    insert_chunks(Vehicles, volumes["vehicles"], vehicle_row)
+
+    # a user favorites an item once (unique indexes), draw again on a repeated pair
+    seen = set()
+    def favorite_row(i):
+        type = favorite_type(i)
+        pair = None
+        while pair is None or pair in seen:
+            pair = (type, random.randint(1, volumes["users"]), random.randint(1, volumes[type + "s"]))
+        seen.add(pair)
+        return {"user_id": pair[1], type + "_id": pair[2]}
+    insert_chunks(Favorites, volumes["favorites"], favorite_row)
+
+    for type in FAVORITE_TYPES:
+        db.session.execute(text(
+            "INSERT INTO favorite_totals (type, item_id, total) "
+            "SELECT '" + type + "', " + type + "_id, count(*) FROM favorites "
+            "WHERE " + type + "_id IS NOT NULL GROUP BY " + type + "_id"
+        ))
+    db.session.commit()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def summarize(latencies, seconds, errors=0):
+    """latencies in milliseconds, seconds is the wall time they were collected in"""
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+
+def peak_rss_kb(pid):
+    # VmHWM is the peak resident set size of the process (Linux only)
+    try:
+        with open("/proc/%d/status" % pid) as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def child_pids(pid):
+    try:
+        with open("/proc/%d/task/%d/children" % (pid, pid)) as children:
+            return [int(child) for child in children.read().split()]
+    except OSError:
+        return []
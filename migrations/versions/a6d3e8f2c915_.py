@@ -0,0 +1,53 @@
+"""one favorite per user and item
+
+Revision ID: a6d3e8f2c915
+Revises: f3c8a2d5b1e9
+Create Date: 2026-10-18 20:41:07.552913
+
+Favorites added twice for the same user and item are collapsed into the
+oldest row before the unique indexes are built, and the favorite totals are
+rebuilt from what is left.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3e8f2c915'
+down_revision = 'f3c8a2d5b1e9'
+branch_labels = None
+depends_on = None
+
+ITEMS = {
+    'planet': 'planet_id',
+    'character': 'character_id',
+    'vehicle': 'vehicle_id',
+}
+
+
+def upgrade():
+    for type, column in ITEMS.items():
+        op.execute(
+            "DELETE FROM favorites WHERE " + column + " IS NOT NULL AND EXISTS ("
+            "SELECT 1 FROM favorites AS kept WHERE kept.user_id = favorites.user_id "
+            "AND kept." + column + " = favorites." + column + " AND kept.id < favorites.id)"
+        )
+
+    op.execute("DELETE FROM favorite_totals")
+    for type, column in ITEMS.items():
+        op.execute(
+            "INSERT INTO favorite_totals (type, item_id, total) "
+            "SELECT '" + type + "', " + column + ", count(*) FROM favorites "
+            "WHERE " + column + " IS NOT NULL GROUP BY " + column
+        )
+
+    op.create_index('ix_favorites_user_id_planet_id', 'favorites', ['user_id', 'planet_id'], unique=True)
+    op.create_index('ix_favorites_user_id_character_id', 'favorites', ['user_id', 'character_id'], unique=True)
+    op.create_index('ix_favorites_user_id_vehicle_id', 'favorites', ['user_id', 'vehicle_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_favorites_user_id_vehicle_id', table_name='favorites')
+    op.drop_index('ix_favorites_user_id_character_id', table_name='favorites')
+    op.drop_index('ix_favorites_user_id_planet_id', table_name='favorites')
@@ -0,0 +1,31 @@
+"""covering index for one user's favorites
+
+Revision ID: c17b4e9d2a58
+Revises: a6d3e8f2c915
+Create Date: 2026-10-18 21:26:53.104682
+
+GET /users/<id>/favorites pages through one user's favorites in id order. The
+composite index answers it with a range scan that never touches the table, and
+its user_id prefix makes the single column index redundant.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c17b4e9d2a58'
+down_revision = 'a6d3e8f2c915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_favorites_user_id_id_planet_id_character_id_vehicle_id', 'favorites',
+                    ['user_id', 'id', 'planet_id', 'character_id', 'vehicle_id'], unique=False)
+    op.drop_index('ix_favorites_user_id', table_name='favorites')
+
+
+def downgrade():
+    op.create_index('ix_favorites_user_id', 'favorites', ['user_id'], unique=False)
+    op.drop_index('ix_favorites_user_id_id_planet_id_character_id_vehicle_id', table_name='favorites')
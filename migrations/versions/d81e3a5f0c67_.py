@@ -0,0 +1,89 @@
+"""full text search index on names
+
+Revision ID: d81e3a5f0c67
+Revises: b4d2f61c9e35
+Create Date: 2026-10-18 15:31:12.904457
+
+Postgres gets GIN indexes on the same to_tsvector() expressions src/search.py
+queries. SQLite gets an FTS5 table kept in sync by triggers, rowid is
+id * 4 + 1/2/3 for planets/characters/vehicles. Batch migrations that
+recreate those three tables on SQLite drop the triggers, recreate them with
+create_sqlite_triggers() when that happens.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81e3a5f0c67'
+down_revision = 'b4d2f61c9e35'
+branch_labels = None
+depends_on = None
+
+# table -> (rowid code, indexed columns)
+SEARCHABLE = {
+    'planets': (1, ['name']),
+    'characters': (2, ['name']),
+    'vehicles': (3, ['name', 'model', 'manufacturer']),
+}
+
+
+def document_values(prefix, columns):
+    values = []
+    for column in ['name', 'model', 'manufacturer']:
+        values.append(prefix + column if column in columns else "''")
+    return ', '.join(values)
+
+
+def create_sqlite_triggers(table):
+    code, columns = SEARCHABLE[table]
+    rowid = '.id * 4 + ' + str(code)
+    op.execute(
+        'CREATE TRIGGER ' + table + '_search_insert AFTER INSERT ON ' + table + ' BEGIN '
+        'INSERT INTO search_index (rowid, name, model, manufacturer) '
+        'VALUES (new' + rowid + ', ' + document_values('new.', columns) + '); END'
+    )
+    op.execute(
+        'CREATE TRIGGER ' + table + '_search_delete AFTER DELETE ON ' + table + ' BEGIN '
+        'DELETE FROM search_index WHERE rowid = old' + rowid + '; END'
+    )
+    op.execute(
+        'CREATE TRIGGER ' + table + '_search_update AFTER UPDATE OF ' + ', '.join(columns) + ' ON ' + table + ' BEGIN '
+        'DELETE FROM search_index WHERE rowid = old' + rowid + '; '
+        'INSERT INTO search_index (rowid, name, model, manufacturer) '
+        'VALUES (new' + rowid + ', ' + document_values('new.', columns) + '); END'
+    )
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.create_index('ix_planets_name_search', 'planets',
+                        [sa.text("to_tsvector('simple', name)")], postgresql_using='gin')
+        op.create_index('ix_characters_name_search', 'characters',
+                        [sa.text("to_tsvector('simple', name)")], postgresql_using='gin')
+        op.create_index('ix_vehicles_name_search', 'vehicles',
+                        [sa.text("to_tsvector('simple', name || ' ' || model || ' ' || manufacturer)")],
+                        postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE search_index USING fts5(name, model, manufacturer, tokenize='unicode61')")
+        for table, (code, columns) in SEARCHABLE.items():
+            op.execute(
+                'INSERT INTO search_index (rowid, name, model, manufacturer) '
+                'SELECT id * 4 + ' + str(code) + ', ' + document_values('', columns) + ' FROM ' + table
+            )
+            create_sqlite_triggers(table)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_vehicles_name_search', table_name='vehicles')
+        op.drop_index('ix_characters_name_search', table_name='characters')
+        op.drop_index('ix_planets_name_search', table_name='planets')
+    elif dialect == 'sqlite':
+        for table in SEARCHABLE:
+            for action in ('insert', 'delete', 'update'):
+                op.execute('DROP TRIGGER IF EXISTS ' + table + '_search_' + action)
+        op.execute('DROP TABLE search_index')
@@ -0,0 +1,62 @@
+"""unique url per planet, character and vehicle
+
+Revision ID: f3c8a2d5b1e9
+Revises: e2a9b7c14f03
+Create Date: 2026-10-18 19:12:40.318207
+
+Rows imported more than once share a url. Before the unique indexes can be
+built every favorite pointing at a duplicate is moved to the oldest row with
+that url, the duplicates are deleted and the favorite totals are rebuilt.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8a2d5b1e9'
+down_revision = 'e2a9b7c14f03'
+branch_labels = None
+depends_on = None
+
+ITEMS = {
+    'planet': ('planets', 'planet_id'),
+    'character': ('characters', 'character_id'),
+    'vehicle': ('vehicles', 'vehicle_id'),
+}
+
+
+def remove_duplicates(table, column):
+    duplicate = ("EXISTS (SELECT 1 FROM " + table + " AS kept "
+                 "WHERE kept.url = " + table + ".url AND kept.id < " + table + ".id)")
+    op.execute(
+        "UPDATE favorites SET " + column + " = ("
+        "SELECT min(kept.id) FROM " + table + " AS kept JOIN " + table + " AS duplicate "
+        "ON kept.url = duplicate.url WHERE duplicate.id = favorites." + column + ") "
+        "WHERE " + column + " IN (SELECT id FROM " + table + " WHERE " + duplicate + ")"
+    )
+    op.execute("DELETE FROM " + table + " WHERE " + duplicate)
+
+
+def upgrade():
+    for type, (table, column) in ITEMS.items():
+        remove_duplicates(table, column)
+
+    op.execute("DELETE FROM favorite_totals")
+    for type, (table, column) in ITEMS.items():
+        op.execute(
+            "INSERT INTO favorite_totals (type, item_id, total) "
+            "SELECT '" + type + "', " + column + ", count(*) FROM favorites "
+            "WHERE " + column + " IS NOT NULL GROUP BY " + column
+        )
+
+    # plain op.create_index, a batch table recreate would drop the search triggers
+    op.create_index('ix_planets_url', 'planets', ['url'], unique=True)
+    op.create_index('ix_characters_url', 'characters', ['url'], unique=True)
+    op.create_index('ix_vehicles_url', 'vehicles', ['url'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_vehicles_url', table_name='vehicles')
+    op.drop_index('ix_characters_url', table_name='characters')
+    op.drop_index('ix_planets_url', table_name='planets')
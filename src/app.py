@@ -2,41 +2,94 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+import click
+from flask import Flask, Blueprint, current_app, request, jsonify, url_for
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
+from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import IntegrityError
+from utils import APIException, fits_int64, sitemap_response
 from models import db, User, Favorites, Planets, Vehicles, Characters
+from pagination import paginate, page_response
+from bulk import bulk_insert, read_records
+from streaming import wants_stream, stream_collection
+from cache import cached, response_cache
+from versions import versioned
+from database import engine_options, replica_binds, env_flag, health
+from fields import requested_fields, projection
+from filters import filter_criteria, sort_columns
+from search import search, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from leaderboard import count_favorite, forget_item, leaderboard, DEFAULT_TOP_LIMIT
+from profiling import setup_profiling, setup_slow_query_log
+from rows import select_page, select_ids, requested_ids, expand_favorites
+from encoding import FastJSONProvider
+from compression import setup_compression
+from sync import sync, sync_command
+from replicas import setup_replicas
+from favorite_writer import favorite_writer, FAVORITES_WRITE_BEHIND
 #from models import Person
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
+api = Blueprint("api", __name__)
 
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def create_app():
+    """
+    Application factory, used by wsgi.py, asgi.py and the flask CLI. Optional
+    parts are only imported when they are used: Flask-Admin with ADMIN=true,
+    Flask-Migrate (and alembic) under the flask CLI, profiling with
+    PROFILING=true. Creating the app never opens a database connection, so it
+    is safe with gunicorn's preload_app (see gunicorn.conf.py).
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.url_map.strict_slashes = False
 
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_BINDS'] = replica_binds()
+
+    db.init_app(app)
+    setup_replicas(app, db)
+    CORS(app)
+    if click.get_current_context(silent=True) is not None:
+        # `flask db ...` needs the migrations extension, gunicorn workers never do
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    if env_flag("ADMIN", "true"):
+        from admin import setup_admin
+        setup_admin(app)
+    app.cli.add_command(sync_command)
+    app.register_blueprint(api)
+    setup_compression(app)
+    setup_slow_query_log()
+    if env_flag("PROFILING", "false"):
+        setup_profiling(app)
+    return app
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
+@api.app_errorhandler(IntegrityError)
+def handle_integrity_error(error):
+    db.session.rollback()
+    # 23505 is Postgres' unique_violation, e.g. a planet whose url is already imported,
+    # use /planets/sync to update it
+    if getattr(error.orig, "pgcode", None) == "23505" or "UNIQUE" in str(error.orig):
+        return jsonify({"message": "The record conflicts with an existing one."}), 409
+    return jsonify({"message": "The record is missing required fields or references a missing record."}), 400
+
 # generate sitemap with all your endpoints
-@app.route('/')
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return sitemap_response(current_app)
 
-@app.route('/users', methods=['GET', 'POST'])
+@api.route('/users', methods=['GET', 'POST'])
+@versioned(User, Favorites)
 def handle_users():
     if request.method == "POST":
         user_name = request.json.get('user_name')
@@ -49,15 +102,37 @@ def handle_users():
         db.session.commit()
         return jsonify(user.serialize()), 201
     
-    users = User.query.all()
-    user_dictionaries = []
-    for user in users:
-        user_dictionaries.append(
-            user.serialize()
-        )
-    return jsonify(user_dictionaries), 200
+    # ?expand=favorites loads every user's favorites in one extra SELECT ... IN query,
+    # without it the listing only reads the user table
+    if 'favorites' not in request.args.get('expand', '').split(','):
+        return jsonify(select_page(User)), 200
+    users, next_cursor = paginate(User.query.options(selectinload(User.favorites)), User)
+    return jsonify(page_response(users, next_cursor)), 200
+
+@api.route('/users/<int:user_id>/favorites', methods=['GET'])
+@versioned(Favorites, Planets, Characters, Vehicles, collection=True)
+def get_user_favorites(user_id):
+    if db.session.get(User, user_id) is None:
+        raise APIException("Could not locate requested user.", status_code=404)
+    page = select_page(Favorites, criteria=[Favorites.user_id == user_id])
+    # ?expand=1 embeds the favorited planets, characters and vehicles, one IN query per type
+    if request.args.get('expand') in ('1', 'true'):
+        expand_favorites(page["results"])
+    return jsonify(page), 200
 
-@app.route("/planets", methods=['GET', 'POST'])
+@api.route('/users/<int:user_id>/favorites/<int:favorite_id>', methods=['DELETE'])
+def delete_user_favorite(user_id, favorite_id):
+    favorite = db.session.get(Favorites, favorite_id)
+    if favorite is None or favorite.user_id != user_id:
+        raise APIException("Could not locate requested favorite for this user.", status_code=404)
+    db.session.delete(favorite)
+    count_favorite(*favorite.item(), -1)
+    db.session.commit()
+    return jsonify({"messsage": "Favorite was successfully deleted."}), 200
+
+@api.route("/planets", methods=['GET', 'POST'])
+@versioned(Planets)
+@cached("planets")
 def handle_planets():
     if request.method == "POST":
         planet = Planets(
@@ -73,18 +148,23 @@ def handle_planets():
         )
         db.session.add(planet)
         db.session.commit()
+        response_cache.invalidate_collection("planets")
         return jsonify(planet.serialize()), 201
     
-    if request.method == "GET":
-        planets = Planets.query.all()
-        planet_dictionaries = []
-        for planet in planets:
-            planet_dictionaries.append(
-                planet.serialize()
-            )
-        return jsonify(planet_dictionaries), 200
-
-@app.route("/characters", methods=['GET', 'POST'])
+    if request.method in ("GET", "HEAD"):
+        fields = requested_fields(Planets)
+        criteria = filter_criteria(Planets)
+        sort = sort_columns(Planets)
+        ids = requested_ids()
+        if ids is not None:
+            return jsonify(select_ids(Planets, ids, fields, criteria)), 200
+        if wants_stream():
+            return stream_collection(Planets, fields, criteria, sort)
+        return jsonify(select_page(Planets, fields, criteria, sort)), 200
+
+@api.route("/characters", methods=['GET', 'POST'])
+@versioned(Characters)
+@cached("characters")
 def handle_characters():
     if request.method == "POST":
         character = Characters(
@@ -100,18 +180,23 @@ def handle_characters():
         )
         db.session.add(character)
         db.session.commit()
+        response_cache.invalidate_collection("characters")
         return jsonify(character.serialize()), 201
     
-    if request.method == 'GET':
-        characters = Characters.query.all()
-        character_dictionaries = []
-        for character in characters:
-            character_dictionaries.append(
-                character.serialize()
-            )
-        return jsonify(character_dictionaries), 200
-
-@app.route("/vehicles", methods=['GET', 'POST'])
+    if request.method in ('GET', 'HEAD'):
+        fields = requested_fields(Characters)
+        criteria = filter_criteria(Characters)
+        sort = sort_columns(Characters)
+        ids = requested_ids()
+        if ids is not None:
+            return jsonify(select_ids(Characters, ids, fields, criteria)), 200
+        if wants_stream():
+            return stream_collection(Characters, fields, criteria, sort)
+        return jsonify(select_page(Characters, fields, criteria, sort)), 200
+
+@api.route("/vehicles", methods=['GET', 'POST'])
+@versioned(Vehicles)
+@cached("vehicles")
 def handle_vehicles():
     if request.method == "POST":
         vehicle = Vehicles(
@@ -130,201 +215,280 @@ def handle_vehicles():
         )
         db.session.add(vehicle)
         db.session.commit()
+        response_cache.invalidate_collection("vehicles")
         return jsonify(vehicle.serialize()), 201
 
-    if request.method == 'GET':
-        vehicles = Vehicles.query.all()
-        vehicle_dictionaries = []
-        for vehicle in vehicles:
-            vehicle_dictionaries.append(
-                vehicle.serialize()
-            )
-        return jsonify(vehicle_dictionaries), 200
+    if request.method in ('GET', 'HEAD'):
+        fields = requested_fields(Vehicles)
+        criteria = filter_criteria(Vehicles)
+        sort = sort_columns(Vehicles)
+        ids = requested_ids()
+        if ids is not None:
+            return jsonify(select_ids(Vehicles, ids, fields, criteria)), 200
+        if wants_stream():
+            return stream_collection(Vehicles, fields, criteria, sort)
+        return jsonify(select_page(Vehicles, fields, criteria, sort)), 200
+
+@api.route("/planets/bulk", methods=['POST'])
+def bulk_planets():
+    body, status = bulk_insert(Planets)
+    if body["created"]:
+        response_cache.invalidate_collection("planets")
+    return jsonify(body), status
+
+@api.route("/characters/bulk", methods=['POST'])
+def bulk_characters():
+    body, status = bulk_insert(Characters)
+    if body["created"]:
+        response_cache.invalidate_collection("characters")
+    return jsonify(body), status
+
+@api.route("/vehicles/bulk", methods=['POST'])
+def bulk_vehicles():
+    body, status = bulk_insert(Vehicles)
+    if body["created"]:
+        response_cache.invalidate_collection("vehicles")
+    return jsonify(body), status
+
+# idempotent imports: records are matched on their SWAPI url, inserted or updated
+@api.route("/planets/sync", methods=['POST'])
+def sync_planets():
+    body = sync("planets", read_records())
+    return jsonify(body), 200 if body["failed"] == 0 else 207
+
+@api.route("/characters/sync", methods=['POST'])
+def sync_characters():
+    body = sync("characters", read_records())
+    return jsonify(body), 200 if body["failed"] == 0 else 207
+
+@api.route("/vehicles/sync", methods=['POST'])
+def sync_vehicles():
+    body = sync("vehicles", read_records())
+    return jsonify(body), 200 if body["failed"] == 0 else 207
+
+@api.route("/search", methods=['GET'])
+@versioned(Planets, Characters, Vehicles)
+def handle_search():
+    q = request.args.get('q', '').strip()
+    if not q:
+        raise APIException("The q parameter is required.", status_code=400)
+    limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    return jsonify({"results": search(q, limit)}), 200
+
+@api.route("/health", methods=['GET'])
+def handle_health():
+    status = health()
+    return jsonify(status), 200 if status["status"] == "ok" else 503
 
-@app.route("/planets/<int:planet_id>", methods=['GET', 'DELETE'])
+@api.route("/cache/stats", methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.stats()), 200
+
+@api.route("/planets/<int:planet_id>", methods=['GET', 'DELETE'])
+@versioned(Planets)
+@cached("planets")
 def handle_planet(planet_id):
-    planet = Planets.query.get(planet_id)
+    fields = requested_fields(Planets)
+    planet = db.session.get(Planets, planet_id, options=projection(Planets, fields))
     if planet is None:
         return jsonify({
             "message": "Could not locate requested planet."
         }), 404
-    if request.method == "GET":
+    if request.method in ("GET", "HEAD"):
+        if fields is not None:
+            return jsonify(planet.serialize_fields(fields)), 200
         return jsonify(planet.serialize()), 200
     if request.method == "DELETE":
         db.session.delete(planet)
+        forget_item("planet", planet_id)
         db.session.commit()
+        response_cache.invalidate_item("planets", planet_id)
         return jsonify({"messsage": "Planet was successfully deleted."}), 200
 
-@app.route("/characters/<int:character_id>", methods=['GET', 'DELETE'])
+@api.route("/characters/<int:character_id>", methods=['GET', 'DELETE'])
+@versioned(Characters)
+@cached("characters")
 def handle_character(character_id):
-    character = Characters.query.get(character_id)
+    fields = requested_fields(Characters)
+    character = db.session.get(Characters, character_id, options=projection(Characters, fields))
     if character is None:
         return jsonify({
             "message": "Could not locate requested character."
         }), 404
-    if request.method == "GET":
+    if request.method in ("GET", "HEAD"):
+        if fields is not None:
+            return jsonify(character.serialize_fields(fields)), 200
         return jsonify(character.serialize()), 200
     if request.method == "DELETE":
         db.session.delete(character)
+        forget_item("character", character_id)
         db.session.commit()
+        response_cache.invalidate_item("characters", character_id)
         return jsonify({"messsage": "Character was successfully deleted."}), 200
 
-@app.route("/vehicles/<int:vehicle_id>", methods=['GET', 'DELETE'])
+@api.route("/vehicles/<int:vehicle_id>", methods=['GET', 'DELETE'])
+@versioned(Vehicles)
+@cached("vehicles")
 def handle_vehicle(vehicle_id):
-    vehicle = Vehicles.query.get(vehicle_id)
+    fields = requested_fields(Vehicles)
+    vehicle = db.session.get(Vehicles, vehicle_id, options=projection(Vehicles, fields))
     if vehicle is None:
         return jsonify({
             "message": "Could not locate requested vehicle."
         }), 404
-    if request.method == "GET":
+    if request.method in ("GET", "HEAD"):
+        if fields is not None:
+            return jsonify(vehicle.serialize_fields(fields)), 200
         return jsonify(vehicle.serialize()), 200
     if request.method == "DELETE":
         db.session.delete(vehicle)
+        forget_item("vehicle", vehicle_id)
         db.session.commit()
+        response_cache.invalidate_item("vehicles", vehicle_id)
         return jsonify({"messsage": "Vehicle was successfully deleted."}), 200
 
-@app.route("/favorites/characters", methods=['GET'])
+def favorite_criteria(*criteria):
+    # optional ?user_id= narrows any favorites listing to a single user
+    criteria = list(criteria)
+    user_id = request.args.get('user_id')
+    if user_id is not None:
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            raise APIException("user_id must be an integer.", status_code=400)
+        if not fits_int64(user_id):
+            raise APIException("user_id must be an integer.", status_code=400)
+        criteria.append(Favorites.user_id == user_id)
+    return criteria
+
+@api.route("/favorites/characters", methods=['GET'])
+@versioned(Favorites)
 def get_favorite_character():
-    favorites = Favorites.query.all()
-    favorite_characters_dictionaries = []
-    for favorite in favorites:
-        if favorite.character_id != None:
-            favorite_characters_dictionaries.append(
-                favorite.serialize()
-            )
-    return jsonify(favorite_characters_dictionaries), 200
-
-@app.route("/favorites/planets", methods=['GET'])
+    criteria = favorite_criteria(Favorites.character_id.isnot(None))
+    return jsonify(select_page(Favorites, criteria=criteria)), 200
+
+@api.route("/favorites/planets", methods=['GET'])
+@versioned(Favorites)
 def get_favorite_planet():
-    favorites = Favorites.query.all()
-    favorite_planets_dictionaries = []
-    for favorite in favorites:
-        if favorite.planet_id != None:
-            favorite_planets_dictionaries.append(
-                favorite.serialize()
-            )
-    return jsonify(favorite_planets_dictionaries), 200
-
-@app.route("/favorites/vehicles", methods=['GET'])
+    criteria = favorite_criteria(Favorites.planet_id.isnot(None))
+    return jsonify(select_page(Favorites, criteria=criteria)), 200
+
+@api.route("/favorites/vehicles", methods=['GET'])
+@versioned(Favorites)
 def get_favorite_vehicle():
-    favorites = Favorites.query.all()
-    favorite_vehicles_dictionaries = []
-    for favorite in favorites:
-        if favorite.vehicle_id != None:
-            favorite_vehicles_dictionaries.append(
-                favorite.serialize()
-            )
-    return jsonify(favorite_vehicles_dictionaries), 200
-
-@app.route("/favorites", methods=['GET'])
+    criteria = favorite_criteria(Favorites.vehicle_id.isnot(None))
+    return jsonify(select_page(Favorites, criteria=criteria)), 200
+
+@api.route("/favorites/top", methods=['GET'])
+@versioned(Favorites, Planets, Characters, Vehicles)
+def get_top_favorites():
+    type = request.args.get('type')
+    limit = request.args.get('limit', DEFAULT_TOP_LIMIT, type=int)
+    return jsonify(leaderboard(type, limit)), 200
+
+@api.route("/favorites", methods=['GET'])
+@versioned(Favorites)
 def get_favorite():
-    favorites = Favorites.query.all()
-    favorite_dictionaries = []
-    for favorite in favorites:
-        favorite_dictionaries.append(
-            favorite.serialize()
+    return jsonify(select_page(Favorites, criteria=favorite_criteria())), 200
+
+def get_favorite_or_404(id, type_column=None, label="favorite"):
+    # primary key lookup, optionally making sure the favorite is of the route's type
+    favorite = db.session.get(Favorites, id)
+    if favorite is None or (type_column is not None and getattr(favorite, type_column) is None):
+        raise APIException(
+            "Could not locate requested " + label + ", are you sure you're using the correct favorites id?",
+            status_code=404
         )
-    return jsonify(favorite_dictionaries), 200
+    return favorite
 
-@app.route("/favorites/<int:id>", methods=['DELETE'])
+@api.route("/favorites/<int:id>", methods=['DELETE'])
 def delete_favorite(id):
-    favorites = Favorites.query.all()
-    for favorite in favorites:
-        if favorite.id is None:
-            return jsonify({
-                "message": "Could not locate requested favorite character, are you sure you're using the correct favorites id?"
-            }), 404
-        elif favorite.id == id:
-            if request.method == 'DELETE':
-                db.session.delete(favorite)
-                db.session.commit()
-                return jsonify({"messsage": "Favorite was successfully deleted."}), 200
-
-@app.route('/favorites/characters/<int:id>', methods=['GET', 'DELETE'])
+    favorite = get_favorite_or_404(id)
+    db.session.delete(favorite)
+    count_favorite(*favorite.item(), -1)
+    db.session.commit()
+    return jsonify({"messsage": "Favorite was successfully deleted."}), 200
+
+@api.route('/favorites/characters/<int:id>', methods=['GET', 'DELETE'])
+@versioned(Favorites)
 def handle_favorite_character(id):
-    favorites = Favorites.query.all()
-    for favorite in favorites:
-        if favorite.id is None:
-            return jsonify({
-                "message": "Could not locate requested favorite character, are you sure you're using the correct favorites id?"
-            }), 404
-        elif favorite.id == id:
-            if request.method == 'GET':
-                return jsonify(favorite.serialize()), 200      
-            if request.method == 'DELETE':
-                # favorite = request.json.get('favorites.id')
-                db.session.delete(favorite)
-                db.session.commit()
-                return jsonify({"messsage": "Favorite character was successfully deleted."}), 200
-
-@app.route('/favorites/planets/<int:id>', methods=['GET', 'DELETE'])
+    favorite = get_favorite_or_404(id, 'character_id', "favorite character")
+    if request.method in ('GET', 'HEAD'):
+        return jsonify(favorite.serialize()), 200
+    if request.method == 'DELETE':
+        db.session.delete(favorite)
+        count_favorite(*favorite.item(), -1)
+        db.session.commit()
+        return jsonify({"messsage": "Favorite character was successfully deleted."}), 200
+
+@api.route('/favorites/planets/<int:id>', methods=['GET', 'DELETE'])
+@versioned(Favorites)
 def handle_favorite_planet(id):
-    favorites = Favorites.query.all()
-    for favorite in favorites:
-        if favorite.id is None:
-            return jsonify({
-                "message": "Could not locate requested favorite planet, are you sure you're using the correct favorites id?"
-            }), 404
-        elif favorite.id == id:
-            if request.method == 'GET':
-                return jsonify(favorite.serialize()), 200      
-            if request.method == 'DELETE':
-                # favorite = request.json.get('favorites.id')
-                db.session.delete(favorite)
-                db.session.commit()
-                return jsonify({"messsage": "Favorite planet was successfully deleted."}), 200
-            
-@app.route('/favorites/vehicles/<int:id>', methods=['GET', 'DELETE'])
+    favorite = get_favorite_or_404(id, 'planet_id', "favorite planet")
+    if request.method in ('GET', 'HEAD'):
+        return jsonify(favorite.serialize()), 200
+    if request.method == 'DELETE':
+        db.session.delete(favorite)
+        count_favorite(*favorite.item(), -1)
+        db.session.commit()
+        return jsonify({"messsage": "Favorite planet was successfully deleted."}), 200
+
+@api.route('/favorites/vehicles/<int:id>', methods=['GET', 'DELETE'])
+@versioned(Favorites)
 def handle_favorite_vehicle(id):
-    favorites = Favorites.query.all()
-    for favorite in favorites:
-        if favorite.id is None:
-            return jsonify({
-                "message": "Could not locate requested favorite vehicle, are you sure you're using the correct favorites id?"
-            }), 404
-        elif favorite.id == id:
-            if request.method == 'GET':
-                return jsonify(favorite.serialize()), 200      
-            if request.method == 'DELETE':
-                # favorite = request.json.get('favorites.id')
-                db.session.delete(favorite)
-                db.session.commit()
-                return jsonify({"messsage": "Favorite vehicle was successfully deleted."}), 200
-
-@app.route("/favorites/vehicles/<int:vehicle_id>", methods=['POST'])
+    favorite = get_favorite_or_404(id, 'vehicle_id', "favorite vehicle")
+    if request.method in ('GET', 'HEAD'):
+        return jsonify(favorite.serialize()), 200
+    if request.method == 'DELETE':
+        db.session.delete(favorite)
+        count_favorite(*favorite.item(), -1)
+        db.session.commit()
+        return jsonify({"messsage": "Favorite vehicle was successfully deleted."}), 200
+
+@api.route("/favorites/vehicles/<int:vehicle_id>", methods=['POST'])
 def add_favorite_vehicle(vehicle_id):
     user_id = request.json.get('user_id')
+    if FAVORITES_WRITE_BEHIND:
+        return jsonify(favorite_writer.submit(user_id, "vehicle", vehicle_id)), 201
     favorite = Favorites(
         vehicle_id = vehicle_id,
         user_id = user_id
     )
     db.session.add(favorite)
+    count_favorite("vehicle", vehicle_id, 1)
     db.session.commit()
     return jsonify(favorite.serialize()), 201
 
-@app.route("/favorites/characters/<int:character_id>", methods=['POST'])
+@api.route("/favorites/characters/<int:character_id>", methods=['POST'])
 def add_favorite_character(character_id):
     user_id = request.json.get('user_id')
+    if FAVORITES_WRITE_BEHIND:
+        return jsonify(favorite_writer.submit(user_id, "character", character_id)), 201
     favorite = Favorites(
         character_id = character_id,
         user_id = user_id
     )
     db.session.add(favorite)
+    count_favorite("character", character_id, 1)
     db.session.commit()
     return jsonify(favorite.serialize()), 201
 
-@app.route("/favorites/planets/<int:planet_id>", methods=['POST'])
+@api.route("/favorites/planets/<int:planet_id>", methods=['POST'])
 def add_favorite_planet(planet_id):
     user_id = request.json.get('user_id')
+    if FAVORITES_WRITE_BEHIND:
+        return jsonify(favorite_writer.submit(user_id, "planet", planet_id)), 201
     favorite = Favorites(
         planet_id = planet_id,
         user_id = user_id
     )
     db.session.add(favorite)
+    count_favorite("planet", planet_id, 1)
     db.session.commit()
     return jsonify(favorite.serialize()), 201
 
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+    create_app().run(host='0.0.0.0', port=PORT, debug=False)
@@ -0,0 +1,241 @@
+# ASGI entry point, the async alternative to wsgi.py. Run it with
+#   $ SERVER_MODE=asgi gunicorn --config src/gunicorn.conf.py --chdir ./src/
+# (see gunicorn.conf.py) or directly with `uvicorn asgi:application`.
+#
+# The hot read routes (entity lists and details, favorites list) are served by
+# async handlers on SQLAlchemy's asyncio engine (aiosqlite / asyncpg), so a slow
+# query only parks a coroutine instead of a whole worker. They send the same
+# ETag and Last-Modified as versions.py and answer conditional GETs with a 304.
+# Every other request, and every read using features the async handlers do not
+# implement (filters, sorting, ?fields=, streaming), goes to the Flask app.
+# With DATABASE_READ_URL the handlers read from the replicas like the Flask
+# routes do (see replicas.py).
+
+import re
+from contextlib import asynccontextmanager
+from datetime import timezone
+from urllib.parse import parse_qsl
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_accept_header, parse_cookie, is_resource_modified, quote_etag, http_date
+from sqlalchemy import event, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+from wsgi import application as app
+from models import Planets, Characters, Vehicles, Favorites
+from database import engine_options, apply_sqlite_pragmas
+from pagination import encode_cursor, parse_page_args
+from rows import model_columns
+from compression import choose_encoding, compress_body
+from utils import APIException
+from versions import versions_query, combine_versions, hash_variant
+from replicas import READ_URLS, REPLICA_KEYS, PIN_COOKIE, pick_replica, mark_down
+
+# path segment -> (table, columns in the response, not found message)
+RESOURCES = {
+    "planets": (Planets.__table__, model_columns(Planets), "Could not locate requested planet."),
+    "characters": (Characters.__table__, model_columns(Characters), "Could not locate requested character."),
+    "vehicles": (Vehicles.__table__, model_columns(Vehicles), "Could not locate requested vehicle."),
+    "favorites": (Favorites.__table__, model_columns(Favorites), None),
+}
+LIST_ARGS = ("limit", "after")
+PATH = re.compile(r"^/(planets|characters|vehicles|favorites)(?:/(\d+))?/?$")
+
+def async_database_url(url):
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+def async_engine_options(url):
+    options = engine_options(url)
+    connect_args = options.pop("connect_args", None)
+    if connect_args and url.startswith("postgresql"):
+        # asyncpg takes server settings instead of libpq's "-c name=value" options
+        timeout = connect_args["options"].split("=", 1)[1]
+        options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+    return options
+
+def create_engine(url):
+    engine = create_async_engine(async_database_url(url), **async_engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(engine.sync_engine, "connect", lambda dbapi_connection, record: apply_sqlite_pragmas(dbapi_connection))
+    return engine
+
+database_url = app.config['SQLALCHEMY_DATABASE_URI']
+engine = create_engine(database_url)
+replica_engines = dict((key, create_engine(url)) for key, url in zip(REPLICA_KEYS, READ_URLS))
+
+flask_application = WsgiToAsgi(app)
+
+def validator_headers(validators):
+    etag, last_modified = validators
+    headers = [(b"etag", quote_etag(etag).encode())]
+    if last_modified is not None:
+        headers.append((b"last-modified", http_date(last_modified.replace(tzinfo=timezone.utc)).encode()))
+    return headers
+
+async def send_json(send, body, status=200, encoding=None, validators=None):
+    # same encoder and formatting as jsonify() on the Flask routes, and the same
+    # compression as compression.py applies to them
+    payload, applied = compress_body(app.json.response(body).get_data(), encoding)
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(payload)).encode()),
+        (b"access-control-allow-origin", b"*"),
+        (b"vary", b"Accept-Encoding"),
+    ]
+    if applied is not None:
+        headers.append((b"content-encoding", applied.encode()))
+    if validators is not None:
+        headers.extend(validator_headers(validators))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": payload})
+
+async def send_not_modified(send, validators):
+    headers = [(b"access-control-allow-origin", b"*"), (b"vary", b"Accept-Encoding")]
+    headers.extend(validator_headers(validators))
+    await send({"type": "http.response.start", "status": 304, "headers": headers})
+    await send({"type": "http.response.body", "body": b""})
+
+def is_modified(scope, validators):
+    # werkzeug only needs the conditional headers out of a WSGI environ
+    environ = {"REQUEST_METHOD": scope["method"]}
+    for name, value in scope["headers"]:
+        if name == b"if-none-match":
+            environ["HTTP_IF_NONE_MATCH"] = value.decode("latin-1")
+        elif name == b"if-modified-since":
+            environ["HTTP_IF_MODIFIED_SINCE"] = value.decode("latin-1")
+    etag, last_modified = validators
+    return is_resource_modified(environ, etag=etag, last_modified=last_modified)
+
+async def read_validators(connection, table, scope, encoding, id=None, updated_at=None):
+    """
+    The ETag and Last-Modified versioned() gives the Flask route, built from
+    the same table_versions row. Detail routes pass the row's id and updated_at.
+    """
+    rows = (await connection.execute(versions_query([table.name]))).all()
+    version, last_modified = combine_versions([table.name], rows)
+    variant = hash_variant(scope["query_string"].decode(), False, encoding)
+    if id is None:
+        return version + "-" + variant, last_modified
+    return version + "-" + str(id) + "-" + variant, updated_at
+
+def request_encoding(scope):
+    for name, value in scope["headers"]:
+        if name == b"accept-encoding":
+            return choose_encoding(parse_accept_header(value.decode("latin-1")))
+    return None
+
+async def list_resource(connection, table, columns, args):
+    limit, after = parse_page_args(args)
+    statement = select(*[table.c[name] for name in columns]).order_by(table.c.id).limit(limit + 1)
+    if after is not None:
+        statement = statement.where(table.c.id > after[0])
+    rows = (await connection.execute(statement)).mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["id"]])
+    return {"results": [dict(row) for row in rows], "next": next_cursor}
+
+async def get_resource(connection, table, columns, id):
+    # updated_at comes along for Last-Modified and is not part of the body
+    statement = select(table.c.updated_at, *[table.c[name] for name in columns]).where(table.c.id == id)
+    row = (await connection.execute(statement)).mappings().first()
+    if row is None:
+        return None, None
+    row = dict(row)
+    return row, row.pop("updated_at")
+
+def pinned_to_primary(scope):
+    for name, value in scope["headers"]:
+        if name == b"cookie" and PIN_COOKIE in parse_cookie(value.decode("latin-1")):
+            return True
+    return False
+
+@asynccontextmanager
+async def read_connection(scope):
+    """
+    A connection for the request's reads: a replica picked round-robin unless
+    the client just wrote, the primary when there is none or it fails to connect.
+    """
+    key = None if not replica_engines or pinned_to_primary(scope) else pick_replica()
+    connection = None
+    if key is not None:
+        try:
+            connection = await replica_engines[key].connect()
+        except DBAPIError:
+            mark_down(key)
+    if connection is None:
+        connection = await engine.connect()
+    try:
+        yield connection
+    finally:
+        await connection.close()
+
+def async_route(scope):
+    """
+    Returns (resource, id, query args) when the async handlers can answer the
+    request exactly like the Flask route would, None otherwise.
+    """
+    if scope["method"] != "GET":
+        return None
+    match = PATH.match(scope["path"])
+    if match is None:
+        return None
+    resource, id = match.group(1), match.group(2)
+    if resource == "favorites" and id is not None:
+        return None
+    for name, value in scope["headers"]:
+        if name == b"accept" and b"ndjson" in value:
+            return None
+    pairs = parse_qsl(scope["query_string"].decode(), keep_blank_values=True)
+    args = dict(pairs)
+    allowed = () if id is not None else LIST_ARGS
+    if any(name not in allowed for name in args):
+        return None
+    # request.args keeps blank values and reads the first of repeated ones, let Flask answer those
+    if len(args) != len(pairs) or "" in args.values():
+        return None
+    return resource, id, args
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await engine.dispose()
+            for replica_engine in replica_engines.values():
+                await replica_engine.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    route = async_route(scope) if scope["type"] == "http" else None
+    if route is None:
+        return await flask_application(scope, receive, send)
+
+    resource, id, args = route
+    table, columns, not_found = RESOURCES[resource]
+    encoding = request_encoding(scope)
+    try:
+        async with read_connection(scope) as connection:
+            if id is None:
+                validators = await read_validators(connection, table, scope, encoding)
+                body = None
+                if is_modified(scope, validators):
+                    body = await list_resource(connection, table, columns, args)
+            else:
+                body, updated_at = await get_resource(connection, table, columns, int(id))
+                if body is None:
+                    return await send_json(send, {"message": not_found}, 404, encoding)
+                validators = await read_validators(connection, table, scope, encoding, id, updated_at)
+        if body is None or not is_modified(scope, validators):
+            return await send_not_modified(send, validators)
+        return await send_json(send, body, encoding=encoding, validators=validators)
+    except APIException as error:
+        return await send_json(send, error.to_dict(), error.status_code, encoding)
@@ -0,0 +1,142 @@
+import os
+import json
+from flask import request
+from models import db
+from utils import APIException, fits_int64
+from database import dialect_insert
+
+MAX_BULK_ROWS = int(os.getenv("BULK_MAX_ROWS", 5000))
+# placeholder for NDJSON lines that could not be parsed
+INVALID_JSON = object()
+
+def writable_columns(model):
+    # the columns a client has to send: no primary key, nothing the database fills in
+    columns = []
+    for column in model.__table__.columns:
+        if column.primary_key or column.default is not None or column.server_default is not None:
+            continue
+        columns.append(column)
+    return columns
+
+def read_records():
+    """
+    Accepts either a JSON array or NDJSON (one JSON object per line, sent with
+    Content-Type: application/x-ndjson). Lines that fail to parse are returned
+    as INVALID_JSON so they can be reported at their position.
+    """
+    if request.mimetype == "application/x-ndjson":
+        records = parse_ndjson(request.get_data(as_text=True))
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            raise APIException("Expected a JSON array or NDJSON body.", status_code=400)
+
+    if len(records) > MAX_BULK_ROWS:
+        raise APIException("A bulk request can contain at most " + str(MAX_BULK_ROWS) + " records.", status_code=413)
+    return records
+
+def parse_ndjson(text):
+    records = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            records.append(INVALID_JSON)
+    return records
+
+def validate_value(column, value):
+    if value is None:
+        return column.name + " is required"
+    python_type = column.type.python_type
+    if python_type is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            return column.name + " must be an integer"
+        if not fits_int64(value):
+            return column.name + " is out of range"
+    elif python_type is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return column.name + " must be a number"
+    elif python_type is str:
+        if not isinstance(value, str):
+            return column.name + " must be a string"
+        if column.type.length is not None and len(value) > column.type.length:
+            return column.name + " must be at most " + str(column.type.length) + " characters"
+    return None
+
+def validate_record(columns, record):
+    if record is INVALID_JSON:
+        return None, ["record is not valid JSON"]
+    if not isinstance(record, dict):
+        return None, ["record must be a JSON object"]
+    errors = []
+    names = set()
+    row = {}
+    for column in columns:
+        names.add(column.name)
+        error = validate_value(column, record.get(column.name))
+        if error is not None:
+            errors.append(error)
+        else:
+            row[column.name] = record[column.name]
+    for key in record:
+        if key not in names:
+            errors.append("unknown field " + key)
+    return row, errors
+
+def conflict_result(index, url):
+    return {"index": index, "status": "conflict", "errors": ["url " + url + " already exists"]}
+
+def bulk_insert(model):
+    """
+    Validates every record and inserts the valid ones with a single
+    executemany INSERT ... ON CONFLICT (url) DO NOTHING inside one
+    transaction. Returns one result per input record, in input order, plus the
+    HTTP status for the whole batch. A record whose url already exists, or
+    repeats one earlier in the batch, is reported as a conflict instead of
+    failing the batch; /<entity>/sync updates existing records.
+    """
+    columns = writable_columns(model)
+    records = read_records()
+
+    results = []
+    rows = []
+    # url -> index of the record that inserts it
+    pending = {}
+    for index, record in enumerate(records):
+        row, errors = validate_record(columns, record)
+        if errors:
+            results.append({"index": index, "status": "error", "errors": errors})
+        elif row["url"] in pending:
+            results.append(conflict_result(index, row["url"]))
+        else:
+            results.append({"index": index, "status": "created", "id": None})
+            pending[row["url"]] = index
+            rows.append(row)
+
+    if rows:
+        # the ORM entity, not the table, so the table version is bumped like for any insert
+        statement = dialect_insert(model).on_conflict_do_nothing(index_elements=["url"])
+        try:
+            created = dict(db.session.execute(statement.returning(model.url, model.id), rows).all())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for url, index in pending.items():
+            if url in created:
+                results[index]["id"] = created[url]
+            else:
+                results[index] = conflict_result(index, url)
+
+    counts = {"created": 0, "conflicts": 0, "failed": 0}
+    for result in results:
+        if result["status"] == "created":
+            counts["created"] += 1
+        elif result["status"] == "conflict":
+            counts["conflicts"] += 1
+        else:
+            counts["failed"] += 1
+    counts["results"] = results
+    return counts, 201 if counts["created"] == len(records) else 207
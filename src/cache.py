@@ -0,0 +1,202 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, g, make_response, request
+from streaming import wants_stream
+from compression import negotiated_encoding, compress_body, set_encoding
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL = int(os.getenv("CACHE_TTL", 60))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+class MemoryBackend:
+    """
+    In-process LRU with a TTL. Every gunicorn worker has its own copy, so
+    writes handled by one worker only invalidate that worker's entries and the
+    others catch up after CACHE_TTL seconds. Use the redis backend when that
+    is not good enough.
+    """
+    name = "memory"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        # generations live outside the LRU so evicting them can never bring back stale lists
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def generation(self, name):
+        with self.lock:
+            return self.generations.get(name, 0)
+
+    def bump(self, name):
+        with self.lock:
+            self.generations[name] = self.generations.get(name, 0) + 1
+            return self.generations[name]
+
+    def size(self):
+        return len(self.entries)
+
+class RedisBackend:
+    """
+    Shared cache for all workers. Takes any client with the redis-py
+    get/set/delete/incr interface, so tests can hand it a local stand-in.
+    """
+    name = "redis"
+
+    def __init__(self, client, ttl=CACHE_TTL, prefix="swapi:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def generation(self, name):
+        value = self.client.get(self.prefix + "generation:" + name)
+        return int(value) if value is not None else 0
+
+    def bump(self, name):
+        return self.client.incr(self.prefix + "generation:" + name)
+
+    def size(self):
+        return None
+
+def create_backend(name=CACHE_BACKEND):
+    if name == "none":
+        return None
+    if name == "redis":
+        import redis
+        return RedisBackend(redis.Redis.from_url(CACHE_REDIS_URL))
+    return MemoryBackend()
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def item_key(self, entity, view_args):
+        return self.item_prefix(entity, view_args.values()) + ":" + self.query_variant() + self.etag_suffix()
+
+    def item_prefix(self, entity, ids):
+        return entity + ":item:" + ":".join(str(id) for id in ids)
+
+    def collection_key(self, entity):
+        # list responses depend on the query string (cursor, limit...), so they are
+        # invalidated all at once by moving the entity to a new generation
+        return entity + ":list:" + str(self.backend.generation(entity)) + ":" + self.query_variant() + self.etag_suffix()
+
+    def query_variant(self):
+        return "&".join(sorted(request.query_string.decode().split("&")))
+
+    def etag_suffix(self):
+        # when the route is versioned the ETag is part of the key, so a body cached by
+        # another worker before a write can never be served under the new ETag
+        etag = g.get("etag")
+        return "@" + etag if etag else ""
+
+    def invalidate_item(self, entity, id):
+        if self.backend is not None:
+            # nothing to delete: every cached route is versioned, its keys end with the
+            # ETag (and the encoding), and the write that got here changed the table
+            # version in it, so the item's old variants are never looked up again and
+            # age out with the TTL or the LRU. The lists move to a new generation.
+            self.backend.bump(entity)
+
+    def invalidate_collection(self, entity):
+        if self.backend is not None:
+            self.backend.bump(entity)
+
+    def stats(self):
+        return {
+            "backend": self.backend.name if self.backend is not None else "none",
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": self.backend.size() if self.backend is not None else 0,
+        }
+
+response_cache = ResponseCache(create_backend())
+
+def pack(body, encoding):
+    # the encoding actually applied is stored with the body, bodies under
+    # COMPRESS_MIN_SIZE stay uncompressed even for clients that accept gzip
+    return (encoding or "identity").encode() + b":" + body
+
+def unpack(value):
+    encoding, _, body = value.partition(b":")
+    encoding = encoding.decode()
+    return body, None if encoding == "identity" else encoding
+
+def cached(entity):
+    """
+    Caches the body of successful GET responses for a route. Routes with view
+    arguments are cached per item, the others per query string. Bodies are
+    stored compressed, once per negotiated encoding.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if response_cache.backend is None or request.method != "GET" or wants_stream():
+                return view(*args, **kwargs)
+            if kwargs:
+                key = response_cache.item_key(entity, kwargs)
+            else:
+                key = response_cache.collection_key(entity)
+            encoding = negotiated_encoding()
+            key += "~" + (encoding or "identity")
+
+            value = response_cache.backend.get(key)
+            if value is not None:
+                response_cache.hits += 1
+                body, applied = unpack(value)
+                response = Response(body, status=200, mimetype="application/json")
+                set_encoding(response, applied)
+                return response
+
+            response_cache.misses += 1
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == "application/json":
+                body, applied = compress_body(response.get_data(), encoding)
+                if applied is not None:
+                    response.set_data(body)
+                set_encoding(response, applied)
+                response_cache.backend.set(key, pack(body, applied))
+            return response
+        return wrapper
+    return decorator
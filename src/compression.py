@@ -0,0 +1,81 @@
+"""
+gzip / brotli compression of JSON responses, negotiated with Accept-Encoding.
+
+Brotli is only offered when the brotli package is installed. Bodies smaller
+than COMPRESS_MIN_SIZE bytes are sent as they are, compressing them costs
+more CPU than the bytes it saves. Cached routes store the body already
+compressed (see cache.py), so a hot list is compressed once per encoding
+instead of once per request. Set COMPRESSION=false when a proxy in front of
+the app already compresses.
+"""
+import os
+import gzip
+from flask import request
+from database import env_flag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION = env_flag("COMPRESSION", "true")
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+
+# in order of preference when the client accepts several with the same quality
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+COMPRESSIBLE_MIMETYPES = ("application/json",)
+
+def choose_encoding(accept_encodings):
+    """
+    The encoding to use for a parsed Accept-Encoding header, None for identity.
+    """
+    if not COMPRESSION:
+        return None
+    # best_match() keeps the first of equally weighted encodings and skips q=0
+    return accept_encodings.best_match(ENCODINGS)
+
+def negotiated_encoding():
+    return choose_encoding(request.accept_encodings)
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+def compress_body(body, encoding):
+    """
+    Returns (body, encoding actually applied), leaving small bodies alone.
+    """
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    return compress(body, encoding), encoding
+
+def set_encoding(response, encoding):
+    response.vary.add("Accept-Encoding")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+
+def compressible(response):
+    return (
+        response.mimetype in COMPRESSIBLE_MIMETYPES
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and "Content-Encoding" not in response.headers
+    )
+
+def compress_response(response):
+    if not COMPRESSION or not compressible(response):
+        return response
+    encoding = negotiated_encoding()
+    body, applied = compress_body(response.get_data(), encoding)
+    if applied is not None:
+        response.set_data(body)
+    set_encoding(response, applied)
+    return response
+
+def setup_compression(app):
+    if COMPRESSION:
+        app.after_request(compress_response)
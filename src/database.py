@@ -0,0 +1,94 @@
+import os
+import sqlite3
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from models import db
+from replicas import READ_URLS, REPLICA_KEYS, replica_status
+
+def env_flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+def engine_options(database_uri):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS built from the environment. The pool settings
+    only apply to server databases, SQLite gets its tuning from pragmas below.
+    """
+    options = {
+        "pool_pre_ping": env_flag("DB_POOL_PRE_PING", "true"),
+    }
+    if database_uri.startswith("sqlite"):
+        return options
+
+    options["pool_size"] = int(os.getenv("DB_POOL_SIZE", 5))
+    options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    options["pool_timeout"] = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    options["pool_recycle"] = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+    statement_timeout = os.getenv("DB_STATEMENT_TIMEOUT")
+    if statement_timeout and database_uri.startswith("postgresql"):
+        # milliseconds, enforced by the server for every statement on the connection
+        options["connect_args"] = {"options": "-c statement_timeout=" + statement_timeout}
+    return options
+
+def replica_binds():
+    """SQLALCHEMY_BINDS for the DATABASE_READ_URL replicas, see replicas.py."""
+    return dict((key, dict(engine_options(url), url=url)) for key, url in zip(REPLICA_KEYS, READ_URLS))
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
+
+def apply_sqlite_pragmas(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers keep going while a writer commits, NORMAL only fsyncs at checkpoints
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=" + os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+    cursor.execute("PRAGMA cache_size=-" + os.getenv("SQLITE_CACHE_KB", "20000"))
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def dialect_insert(table):
+    """
+    INSERT construct of the current dialect, for on_conflict_do_update() and
+    on_conflict_do_nothing(). Postgres and SQLite share the same API.
+    """
+    if db.engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+def dispose_after_fork(app):
+    """
+    Forgets the pooled connections a forked worker inherited from the gunicorn
+    master (preload_app) without closing them, they still belong to the master.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    return status
+
+def health():
+    try:
+        # explicitly on the primary, GET /health would otherwise ask a replica
+        db.session.execute(text("SELECT 1"), bind_arguments={"bind": db.engine})
+        database = "ok"
+    except Exception as error:
+        db.session.rollback()
+        database = "error: " + type(error).__name__
+    status = {
+        "status": "ok" if database == "ok" else "unavailable",
+        "database": database,
+        "pool": pool_status(db.engine),
+    }
+    if REPLICA_KEYS:
+        status["replicas"] = replica_status(db)
+    return status
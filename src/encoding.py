@@ -0,0 +1,35 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Encodes responses with orjson when it is installed, several times faster
+    than the json module on large lists. Falls back to Flask's encoder when
+    orjson is missing, for arguments orjson has no equivalent for and for
+    values it refuses (integers over 64 bits).
+
+    orjson writes UTF-8 instead of \\u escapes, everything else matches Flask:
+    keys are sorted and datetimes still go through Flask's default() so they
+    keep the HTTP date format.
+    """
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent") == 2:
+            option |= orjson.OPT_INDENT_2
+            kwargs.pop("indent")
+        if kwargs.get("separators") == (",", ":"):
+            kwargs.pop("separators")
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except orjson.JSONEncodeError:
+            return super().dumps(obj)
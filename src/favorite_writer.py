@@ -0,0 +1,178 @@
+"""
+Opt-in write-behind queue for the POST /favorites/<type>/<id> routes, enabled
+with FAVORITES_WRITE_BEHIND=true.
+
+Every request hands its row to a writer thread and waits. The thread collects
+the rows that arrive within FAVORITES_BATCH_WINDOW_MS (at most
+FAVORITES_BATCH_SIZE of them), inserts them with one statement and commits
+once, then wakes every request with its own result. A request therefore waits
+at most one window plus one commit, and N concurrent requests share a single
+commit instead of queueing for N of them, which is what limits write
+throughput on SQLite and on a Postgres with synchronous_commit.
+
+The batching only helps when a worker handles several requests at once, so
+run gunicorn with threads (e.g. GUNICORN_CMD_ARGS="--threads 16"). With one
+request per worker it only adds the window to every insert.
+"""
+import os
+import queue
+import threading
+from time import monotonic
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models import db, Favorites
+from utils import APIException, fits_int64
+from database import dialect_insert, env_flag
+from versions import bump_versions
+from leaderboard import count_favorite
+
+FAVORITES_WRITE_BEHIND = env_flag("FAVORITES_WRITE_BEHIND", "false")
+FAVORITES_BATCH_WINDOW_MS = float(os.getenv("FAVORITES_BATCH_WINDOW_MS", 5))
+FAVORITES_BATCH_SIZE = int(os.getenv("FAVORITES_BATCH_SIZE", 256))
+# how long a request waits for its batch before giving up with a 503
+SUBMIT_TIMEOUT = 10
+
+ITEM_COLUMNS = {
+    "planet": "planet_id",
+    "character": "character_id",
+    "vehicle": "vehicle_id",
+}
+KEY_COLUMNS = ("user_id", "planet_id", "character_id", "vehicle_id")
+
+favorites = Favorites.__table__
+
+class PendingFavorite:
+    def __init__(self, type, row):
+        self.type = type
+        self.row = row
+        self.key = tuple(row[name] for name in KEY_COLUMNS)
+        self.result = None
+        self.error = None
+        self.committed = False
+        self.done = threading.Event()
+
+class FavoriteWriter:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def submit(self, user_id, type, item_id):
+        """
+        Queues one favorite and blocks until its batch is committed. Returns
+        the serialized favorite, raises APIException 409 when the user already
+        has it.
+        """
+        # the created rows are matched back to the requests by value
+        if not isinstance(user_id, int) or isinstance(user_id, bool) or not fits_int64(user_id):
+            raise APIException("user_id must be an integer.", status_code=400)
+        row = dict.fromkeys(KEY_COLUMNS)
+        row["user_id"] = user_id
+        row[ITEM_COLUMNS[type]] = item_id
+        pending = PendingFavorite(type, row)
+        self.start(current_app._get_current_object())
+        self.queue.put(pending)
+        if not pending.done.wait(SUBMIT_TIMEOUT):
+            raise APIException("The favorite could not be saved in time, try again.", status_code=503)
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def start(self, app):
+        # started on first use in every worker, a thread started before a fork does not survive it
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            thread = threading.Thread(target=self.run, args=(app,), name="favorite-writer", daemon=True)
+            thread.start()
+            self.pid = os.getpid()
+
+    def run(self, app):
+        window = FAVORITES_BATCH_WINDOW_MS / 1000
+        while True:
+            batch = [self.queue.get()]
+            deadline = monotonic() + window
+            while len(batch) < FAVORITES_BATCH_SIZE:
+                timeout = deadline - monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                with app.app_context():
+                    self.write(batch)
+            except Exception as error:
+                # the thread has to outlive any error, or every later request in this worker times out
+                for pending in batch:
+                    if not pending.committed:
+                        pending.result = None
+                        pending.error = error
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def write(self, batch):
+        try:
+            insert_batch(batch)
+            db.session.commit()
+            for pending in batch:
+                pending.committed = True
+        except Exception as error:
+            db.session.rollback()
+            if len(batch) > 1:
+                # one bad row (e.g. a user that does not exist) must not fail the others
+                for pending in batch:
+                    self.write([pending])
+            elif isinstance(error, IntegrityError):
+                batch[0].error = APIException(
+                    "The record is missing required fields or references a missing record.", status_code=400)
+            else:
+                batch[0].error = error
+
+def insert_batch(batch):
+    """
+    Inserts the batch with one INSERT ... ON CONFLICT DO NOTHING in the
+    current transaction and records on every pending favorite either the
+    created row or a 409. Updates the totals and the favorites version once.
+    """
+    unique = {}
+    for pending in batch:
+        if pending.key in unique:
+            pending.error = conflict()
+        else:
+            unique[pending.key] = pending
+    statement = (
+        dialect_insert(favorites)
+        .values([pending.row for pending in unique.values()])
+        .on_conflict_do_nothing()
+        .returning(favorites.c.id, *[favorites.c[name] for name in KEY_COLUMNS])
+    )
+    created = {}
+    for row in db.session.execute(statement):
+        created[tuple(row[1:])] = row[0]
+
+    # Core statements are invisible to the session events, bump the ETags by hand. Done
+    # before the totals so the version row is locked first, like every other writer
+    # (see leaderboard.lock_versions_first).
+    if created:
+        bump_versions(db.session.connection(), [favorites.name])
+
+    deltas = {}
+    for key, pending in unique.items():
+        if key not in created:
+            pending.error = conflict()
+            continue
+        pending.error = None
+        pending.result = dict(pending.row, id=created[key])
+        item = (pending.type, pending.row[ITEM_COLUMNS[pending.type]])
+        deltas[item] = deltas.get(item, 0) + 1
+
+    for (type, item_id), delta in sorted(deltas.items()):
+        count_favorite(type, item_id, delta)
+
+def conflict():
+    return APIException("The record conflicts with an existing one.", status_code=409)
+
+favorite_writer = FavoriteWriter()
@@ -0,0 +1,33 @@
+from flask import request
+from sqlalchemy.orm import load_only
+from utils import APIException
+
+def requested_fields(model):
+    """
+    Parses ?fields=name,population into a list of column names, or None when
+    the client wants every field.
+    """
+    raw = request.args.get("fields")
+    if not raw:
+        return None
+    fields = []
+    for field in raw.split(","):
+        field = field.strip()
+        if field and field != "id" and field not in fields:
+            fields.append(field)
+    unknown = [field for field in fields if field not in model.public_fields]
+    if unknown:
+        raise APIException("Unknown fields: " + ", ".join(unknown), status_code=400,
+                           payload={"allowed_fields": list(model.public_fields)})
+    return fields
+
+def projection(model, fields, sort=()):
+    # SELECT only the requested columns (the primary key is always included),
+    # plus the sort keys the pagination cursor is built from
+    if fields is None:
+        return []
+    columns = [getattr(model, field) for field in fields]
+    for column, _ in sort:
+        if column.key not in fields:
+            columns.append(column)
+    return [load_only(*columns)]
@@ -0,0 +1,88 @@
+from flask import request
+from utils import APIException, fits_int64
+
+# query parameters that mean something else than a column filter
+RESERVED_ARGS = ("limit", "after", "fields", "stream", "expand", "sort", "user_id", "ids")
+
+OPERATORS = {
+    "eq": lambda column, value: column == value,
+    "ne": lambda column, value: column != value,
+    "in": lambda column, value: column.in_(value),
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+}
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+
+def is_numeric(column):
+    return column.type.python_type in (int, float)
+
+def parse_value(column, raw):
+    if is_numeric(column):
+        try:
+            value = column.type.python_type(raw)
+        except ValueError:
+            raise APIException(column.name + " must be a number.", status_code=400)
+        if isinstance(value, int) and not fits_int64(value):
+            raise APIException(column.name + " is out of range.", status_code=400)
+        return value
+    return raw
+
+def filter_criteria(model):
+    """
+    Turns the query string into SQL criteria:
+
+        ?climate=arid                     equality
+        ?climate__in=arid,temperate       IN (...)
+        ?population__gte=1000             gt, gte, lt, lte on numeric columns
+        ?gender__ne=n/a                   not equal
+
+    Repeating a parameter ANDs the conditions. Only model.filterable_fields
+    can be used; the commonly filtered ones have (column, id) indexes so a
+    filtered page is still an index range scan.
+    """
+    criteria = []
+    for key, raw_values in request.args.lists():
+        if key in RESERVED_ARGS or key.startswith("_"):
+            continue
+        name, _, operator = key.partition("__")
+        operator = operator or "eq"
+        if name not in model.filterable_fields:
+            raise APIException("Cannot filter on " + name + ".", status_code=400,
+                               payload={"filterable_fields": list(model.filterable_fields)})
+        if operator not in OPERATORS:
+            raise APIException("Unknown filter operator " + operator + ".", status_code=400)
+        column = model.__table__.c[name]
+        if operator in RANGE_OPERATORS and not is_numeric(column):
+            raise APIException(name + " does not support range filters.", status_code=400)
+
+        for raw in raw_values:
+            if operator == "in":
+                value = [parse_value(column, item) for item in raw.split(",")]
+            else:
+                value = parse_value(column, raw)
+            criteria.append(OPERATORS[operator](getattr(model, name), value))
+    return criteria
+
+def sort_columns(model):
+    """
+    ?sort=-population,name sorts by population descending then name. Returns
+    a list of (attribute, descending) pairs, the id tiebreaker is added by
+    paginate().
+    """
+    raw = request.args.get("sort")
+    if not raw:
+        return []
+    sort = []
+    for name in raw.split(","):
+        name = name.strip()
+        descending = name.startswith("-")
+        name = name.lstrip("-")
+        if not name:
+            continue
+        if name != "id" and name not in model.sortable_fields:
+            raise APIException("Cannot sort on " + name + ".", status_code=400,
+                               payload={"sortable_fields": list(model.sortable_fields)})
+        sort.append((getattr(model, name), descending))
+    return sort
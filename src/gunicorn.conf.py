@@ -0,0 +1,28 @@
+# Loaded with `gunicorn --config src/gunicorn.conf.py --chdir ./src/` (see Procfile).
+# SERVER_MODE=wsgi (default) serves wsgi.py with gunicorn's sync workers,
+# SERVER_MODE=asgi serves asgi.py with uvicorn workers.
+# GUNICORN_PRELOAD=true imports the app once in the master and forks the
+# workers from it, so they boot faster and share the memory of the imported code.
+import os
+
+server_mode = os.getenv("SERVER_MODE", "wsgi")
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() in ("1", "true", "yes", "on")
+
+if server_mode == "asgi":
+    wsgi_app = "asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "wsgi:application"
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    # a connection opened in the master must never be shared by two processes
+    from wsgi import application
+    from database import dispose_after_fork
+    dispose_after_fork(application)
+    if server_mode == "asgi":
+        import asgi
+        asgi.engine.sync_engine.dispose(close=False)
+        for engine in asgi.replica_engines.values():
+            engine.sync_engine.dispose(close=False)
@@ -0,0 +1,73 @@
+from sqlalchemy import delete, select, update
+from models import db, Planets, Characters, Vehicles, FavoriteTotal
+from utils import APIException
+from database import dialect_insert
+
+DEFAULT_TOP_LIMIT = 10
+MAX_TOP_LIMIT = 100
+
+MODELS = {
+    "planet": Planets,
+    "character": Characters,
+    "vehicle": Vehicles,
+}
+
+# statements go through the Core table so they do not bump the ORM table versions
+totals = FavoriteTotal.__table__
+
+def lock_versions_first():
+    # Core statements on the totals table do not autoflush. Flushing here bumps the
+    # table_versions rows first, so every writer locks them before the totals rows.
+    db.session.flush()
+
+def count_favorite(type, item_id, delta):
+    """
+    Adds delta to the item's total in the caller's transaction. Increments are
+    a single INSERT ... ON CONFLICT DO UPDATE so concurrent requests never lose
+    a count.
+    """
+    if type is None:
+        return
+    lock_versions_first()
+    if delta > 0:
+        statement = dialect_insert(totals).values(type=type, item_id=item_id, total=delta)
+        statement = statement.on_conflict_do_update(
+            index_elements=[totals.c.type, totals.c.item_id],
+            set_={"total": totals.c.total + delta},
+        )
+    else:
+        statement = (
+            update(totals)
+            .where(totals.c.type == type, totals.c.item_id == item_id)
+            .values(total=totals.c.total + delta)
+        )
+    db.session.execute(statement)
+
+def forget_item(type, item_id):
+    lock_versions_first()
+    db.session.execute(delete(totals).where(totals.c.type == type, totals.c.item_id == item_id))
+
+def top_favorites(type, limit):
+    # walks ix_favorite_totals_type_total backwards and joins the names of the top rows only
+    model = MODELS[type]
+    rows = db.session.execute(
+        select(model.id, model.name, totals.c.total)
+        .join(model, model.id == totals.c.item_id)
+        .where(totals.c.type == type, totals.c.total > 0)
+        .order_by(totals.c.total.desc(), totals.c.item_id.desc())
+        .limit(limit)
+    )
+    results = []
+    for id, name, total in rows:
+        results.append({"id": id, "name": name, "favorites": total})
+    return results
+
+def leaderboard(type, limit):
+    if type is not None and type not in MODELS:
+        raise APIException("type must be one of " + ", ".join(MODELS) + ".", status_code=400)
+    limit = max(1, min(limit, MAX_TOP_LIMIT))
+    types = [type] if type is not None else list(MODELS)
+    board = {}
+    for name in types:
+        board[name + "s"] = top_favorites(name, limit)
+    return board
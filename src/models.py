@@ -1,44 +1,56 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.sql import func
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+class SparseFieldsMixin:
+    # the columns clients can pick with ?fields=, id is always returned
+    public_fields = ()
+    # the columns usable in filters and ?sort= (see filters.py)
+    filterable_fields = ()
+    sortable_fields = ()
+
+    def serialize_fields(self, fields):
+        # only touches the requested attributes, so it is safe on rows loaded with load_only
+        fields_dictionary = {"id": self.id}
+        for field in fields:
+            fields_dictionary[field] = getattr(self, field)
+        return fields_dictionary
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_name = db.Column(db.String(50), nullable=False)
     email = db.Column(db.String(250), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
     favorites = db.relationship("Favorites", backref="user")
 
     def __init__(self, user_name, email):
         self.user_name = user_name
         self.email = email
-        db.session.add(self)
-        try: 
-            db.session.commit()
-        except Exception as error:
-            db.session.rollback()
-            raise Exception(error.args)
         
     # def __repr__(self):
     #     return '<User %r>' % self.username
     
-    def serialize(self):
-        favorites_dictionaries = []
-        for favorite in self.favorites:
-            favorites_dictionaries.append(
-                favorite.serialize()
-            )
-
-        return {
+    def serialize(self, include_favorites=True):
+        user_dictionary = {
             "id": self.id,
             "user_name": self.user_name,
             "email": self.email,
-            "favorites": favorites_dictionaries,
         }
+        # self.favorites is lazy loaded, only touch it when the caller asked for it
+        if include_favorites:
+            favorites_dictionaries = []
+            for favorite in self.favorites:
+                favorites_dictionaries.append(
+                    favorite.serialize()
+                )
+            user_dictionary["favorites"] = favorites_dictionaries
+        return user_dictionary
     
-class Planets(db.Model):
+class Planets(SparseFieldsMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    url = db.Column(db.String(1000), nullable=False)
+    url = db.Column(db.String(1000), nullable=False, unique=True, index=True)
     diameter = db.Column(db.Integer, nullable=False)
     rotation_period = db.Column(db.Integer, nullable=False)
     orbital_period = db.Column(db.Integer, nullable=False)
@@ -47,7 +59,20 @@ class Planets(db.Model):
     population = db.Column(db.Integer, nullable=False)
     gravity = db.Column(db.String(250), nullable=False)
     climate = db.Column(db.String(250), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
     favorites = db.relationship("Favorites", backref="planet")
+    public_fields = ('url', 'diameter', 'rotation_period', 'orbital_period', 'name',
+                     'terrain', 'population', 'gravity', 'climate')
+    filterable_fields = ('name', 'climate', 'terrain', 'population', 'diameter',
+                         'rotation_period', 'orbital_period')
+    sortable_fields = ('name', 'population', 'diameter', 'rotation_period', 'orbital_period')
+    __table_args__ = (
+        db.Index('ix_planets_name_id', 'name', 'id'),
+        db.Index('ix_planets_climate_id', 'climate', 'id'),
+        db.Index('ix_planets_terrain_id', 'terrain', 'id'),
+        db.Index('ix_planets_population_id', 'population', 'id'),
+        db.Index('ix_planets_diameter_id', 'diameter', 'id'),
+    )
 
     def __init__(self, url, diameter, rotation_period, orbital_period, 
                  name, terrain, population, gravity, climate):
@@ -60,8 +85,6 @@ class Planets(db.Model):
         self.population = population
         self.gravity = gravity
         self.climate = climate
-        db.session.add(self)
-        db.session.commit()
     
     def serialize(self): 
         return {
@@ -77,9 +100,9 @@ class Planets(db.Model):
             "climate": self.climate,
         }
 
-class Characters(db.Model):
+class Characters(SparseFieldsMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    url = db.Column(db.String(1000), nullable=False)
+    url = db.Column(db.String(1000), nullable=False, unique=True, index=True)
     name = db.Column(db.String(250), nullable=False)
     hair_color = db.Column(db.String(250), nullable=False)
     skin_color = db.Column(db.String(250), nullable=False)
@@ -88,7 +111,18 @@ class Characters(db.Model):
     height = db.Column(db.Integer, nullable=False)
     mass = db.Column(db.Integer, nullable=False)
     gender = db.Column(db.String(250), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
     favorites = db.relationship("Favorites", backref="character")
+    public_fields = ('url', 'name', 'hair_color', 'skin_color', 'eye_color',
+                     'birth_year', 'height', 'mass', 'gender')
+    filterable_fields = ('name', 'gender', 'eye_color', 'hair_color', 'skin_color',
+                         'height', 'mass')
+    sortable_fields = ('name', 'height', 'mass')
+    __table_args__ = (
+        db.Index('ix_characters_name_id', 'name', 'id'),
+        db.Index('ix_characters_gender_id', 'gender', 'id'),
+        db.Index('ix_characters_eye_color_id', 'eye_color', 'id'),
+    )
 
     def __init__(self, url, name, hair_color, skin_color, 
                  eye_color, birth_year, height, mass, gender):
@@ -101,8 +135,6 @@ class Characters(db.Model):
         self.height = height
         self.mass = mass
         self.gender = gender
-        db.session.add(self)
-        db.session.commit()
     
     def serialize(self): 
         return {
@@ -118,10 +150,10 @@ class Characters(db.Model):
             "gender": self.gender,
         }
 
-class Vehicles(db.Model):
+class Vehicles(SparseFieldsMixin, db.Model):
     __tablename__ = 'vehicles'
     id = db.Column(db.Integer, primary_key=True)
-    url = db.Column(db.String(1000), nullable=False)
+    url = db.Column(db.String(1000), nullable=False, unique=True, index=True)
     name = db.Column(db.String(250), nullable=False)
     vehicle_class = db.Column(db.String(250), nullable=False)
     manufacturer = db.Column(db.String(250), nullable=False)
@@ -133,7 +165,20 @@ class Vehicles(db.Model):
     max_atmosphering_speed = db.Column(db.Integer, nullable=False)
     cargo_capacity = db.Column(db.Integer, nullable=False)
     consumables = db.Column(db.String(250), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
     favorites = db.relationship("Favorites", backref="vehicle")
+    public_fields = ('name', 'vehicle_class', 'manufacturer', 'model', 'crew',
+                     'cost_in_credits', 'length', 'passengers',
+                     'max_atmosphering_speed', 'cargo_capacity', 'consumables')
+    filterable_fields = ('name', 'manufacturer', 'vehicle_class', 'model', 'cost_in_credits',
+                         'crew', 'passengers', 'cargo_capacity', 'length')
+    sortable_fields = ('name', 'cost_in_credits', 'crew', 'passengers', 'cargo_capacity', 'length')
+    __table_args__ = (
+        db.Index('ix_vehicles_name_id', 'name', 'id'),
+        db.Index('ix_vehicles_manufacturer_id', 'manufacturer', 'id'),
+        db.Index('ix_vehicles_cost_in_credits_id', 'cost_in_credits', 'id'),
+        db.Index('ix_vehicles_crew_id', 'crew', 'id'),
+    )
 
     def __init__(self, url, name, vehicle_class, manufacturer, 
                  model, crew, cost_in_credits, length, passengers, 
@@ -150,8 +195,6 @@ class Vehicles(db.Model):
         self.max_atmosphering_speed = max_atmosphering_speed
         self.cargo_capacity = cargo_capacity
         self.consumables = consumables
-        db.session.add(self)
-        db.session.commit()
     
     def serialize(self): 
         return {
@@ -172,17 +215,35 @@ class Vehicles(db.Model):
 class Favorites(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id'))
-    character_id = db.Column(db.Integer, db.ForeignKey('characters.id'))
-    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id'))
+    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id'), index=True)
+    character_id = db.Column(db.Integer, db.ForeignKey('characters.id'), index=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id'), index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+    # a user favorites an item once, NULL item columns never collide
+    __table_args__ = (
+        db.Index('ix_favorites_user_id_planet_id', 'user_id', 'planet_id', unique=True),
+        db.Index('ix_favorites_user_id_character_id', 'user_id', 'character_id', unique=True),
+        db.Index('ix_favorites_user_id_vehicle_id', 'user_id', 'vehicle_id', unique=True),
+        # one user's favorites in id order straight from the index, it replaces the user_id index
+        db.Index('ix_favorites_user_id_id_planet_id_character_id_vehicle_id',
+                 'user_id', 'id', 'planet_id', 'character_id', 'vehicle_id'),
+    )
 
     def __init__(self, user_id, planet_id=None, character_id=None, vehicle_id=None):
         self.user_id = user_id
         self.planet_id = planet_id
         self.character_id = character_id
         self.vehicle_id = vehicle_id
-        db.session.add(self)
-        db.session.commit()
+
+    def item(self):
+        # what was favorited, as a (type, id) pair
+        if self.planet_id is not None:
+            return "planet", self.planet_id
+        if self.character_id is not None:
+            return "character", self.character_id
+        if self.vehicle_id is not None:
+            return "vehicle", self.vehicle_id
+        return None, None
     
     def serialize(self):
         return {
@@ -191,4 +252,21 @@ class Favorites(db.Model):
             "character_id": self.character_id,
             "planet_id": self.planet_id,
             "vehicle_id": self.vehicle_id,
-        }
\ No newline at end of file
+        }
+
+class TableVersion(db.Model):
+    # one row per table, bumped in the same transaction as every write to it (see versions.py)
+    __tablename__ = 'table_versions'
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+class FavoriteTotal(db.Model):
+    # how many favorites each planet/character/vehicle has, kept up to date by the favorites routes
+    __tablename__ = 'favorite_totals'
+    type = db.Column(db.String(20), primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.Index('ix_favorite_totals_type_total', 'type', 'total', 'item_id'),
+    )
@@ -0,0 +1,113 @@
+import os
+import json
+import base64
+import binascii
+from flask import request
+from sqlalchemy import and_, or_
+from utils import APIException, fits_int64
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", 100))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", 1000))
+
+def encode_cursor(values):
+    # cursors are opaque to clients, they only need to send them back as `after`
+    raw = json.dumps({"k": values}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor, key_count):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded))["k"]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise APIException("Invalid pagination cursor.", status_code=400)
+    # a cursor only makes sense with the sort it was created for
+    if not isinstance(values, list) or len(values) != key_count:
+        raise APIException("Invalid pagination cursor.", status_code=400)
+    # only scalars can be bound, None is what a cursor holds for a NULL sort key
+    for value in values:
+        if value is None or isinstance(value, (float, str)):
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or not fits_int64(value):
+            raise APIException("Invalid pagination cursor.", status_code=400)
+    return values
+
+def get_page_args(key_count=1):
+    return parse_page_args(request.args, key_count)
+
+def parse_page_args(args, key_count=1):
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise APIException("The limit parameter must be an integer.", status_code=400)
+    if limit < 1:
+        raise APIException("The limit parameter must be greater than zero.", status_code=400)
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    after = args.get("after")
+    if after:
+        return limit, decode_cursor(after, key_count)
+    return limit, None
+
+def keyset_predicate(keys, values):
+    # (a, b, id) > (x, y, z) spelled out so every key can have its own direction:
+    # a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+    clauses = []
+    for index, (column, descending) in enumerate(keys):
+        equal = [keys[previous][0] == values[previous] for previous in range(index)]
+        if descending:
+            clauses.append(and_(*equal, column < values[index]))
+        else:
+            clauses.append(and_(*equal, column > values[index]))
+    return or_(*clauses)
+
+def keyset_page(query, model, sort=None):
+    """
+    Keyset pagination: instead of OFFSET we ask for the rows after the last
+    sort key the client saw, so every page is a bounded index range scan no
+    matter how deep into the table the client is. `sort` is a list of
+    (attribute, descending) pairs, the primary key is always the last key.
+    Works on ORM queries and Core select()s alike, returns the query for the
+    page (one row longer than the page, see next_page()), its keys and limit.
+    """
+    keys = list(sort or [])
+    if not keys or keys[-1][0] is not model.id:
+        # the tiebreaker follows the last key's direction so a (column, id) index
+        # can be walked in one direction without an extra sort step
+        keys.append((model.id, keys[-1][1] if keys else False))
+    limit, after = get_page_args(len(keys))
+    if after is not None:
+        query = query.filter(keyset_predicate(keys, after))
+
+    order = []
+    for column, descending in keys:
+        order.append(column.desc() if descending else column.asc())
+    # fetch one extra row to know whether there is a next page
+    return query.order_by(*order).limit(limit + 1), keys, limit
+
+def next_page(rows, keys, limit):
+    # ORM instances and Core rows both expose the key columns as attributes
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column, _ in keys])
+    return rows, next_cursor
+
+def paginate(query, model, sort=None):
+    """
+    Returns the rows of the current page and the cursor for the next one (or
+    None), see keyset_page().
+    """
+    query, keys, limit = keyset_page(query, model, sort)
+    return next_page(query.all(), keys, limit)
+
+def page_response(rows, next_cursor, fields=None, **serialize_args):
+    results = []
+    for row in rows:
+        if fields is not None:
+            results.append(row.serialize_fields(fields))
+        else:
+            results.append(row.serialize(**serialize_args))
+    return {
+        "results": results,
+        "next": next_cursor,
+    }
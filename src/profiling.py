@@ -0,0 +1,212 @@
+"""
+Opt-in request profiling, enabled with PROFILING=1.
+
+For every request it records the wall time, the number of SQL statements and
+the time spent running them, the ORM instances hydrated and the time spent in
+JSON encoding. The numbers go out in a Server-Timing header, which browser dev
+tools show next to the request:
+
+    Server-Timing: app;dur=41.2, db;dur=6.8;desc="3 queries", serialize;dur=12.9, orm;desc="100 rows"
+
+and are aggregated per route on GET /metrics in the Prometheus text format.
+The counters live in the worker process, like the memory cache, so scrape
+every worker or run a single one. Streamed responses run their queries after
+the headers are sent, and the async handlers in asgi.py bypass Flask, so
+neither shows up here.
+
+SLOW_QUERY_MS=<milliseconds> additionally logs every statement slower than
+the threshold with its duration and route, with or without PROFILING.
+"""
+import os
+import logging
+from threading import Lock
+from time import perf_counter
+from flask import g, request, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import db
+
+logger = logging.getLogger("profiling")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# per route counters exported as <name>_total, in the order of PROFILE_FIELDS
+PROFILE_FIELDS = ("statements", "db_seconds", "rows", "serialize_seconds")
+METRICS = (
+    ("db_statements", "SQL statements executed."),
+    ("db_seconds", "Time spent executing SQL statements."),
+    ("orm_rows_loaded", "ORM instances hydrated from query results."),
+    ("serialization_seconds", "Time spent encoding JSON responses."),
+)
+
+class Metrics:
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = {}
+        self.durations = {}
+        self.totals = {}
+        self.slow_statements = 0
+
+    def observe(self, method, route, status, seconds, profile):
+        with self.lock:
+            key = (method, route, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            key = (method, route)
+            histogram = self.durations.setdefault(key, [0] * len(DURATION_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+            totals = self.totals.setdefault(key, [0] * len(PROFILE_FIELDS))
+            for i, name in enumerate(PROFILE_FIELDS):
+                totals[i] += profile[name]
+
+    def slow_statement(self):
+        with self.lock:
+            self.slow_statements += 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            lines.append("# HELP http_requests_total Requests handled.")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append("http_requests_total" + labels(method=method, route=route, status=status) + " %d" % count)
+
+            lines.append("# HELP http_request_duration_seconds Request wall time.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route), histogram in sorted(self.durations.items()):
+                # buckets are cumulative in the exposition format, observe() already counts
+                # a request in every bucket it fits
+                for bound, count in zip(DURATION_BUCKETS, histogram):
+                    lines.append("http_request_duration_seconds_bucket"
+                                 + labels(method=method, route=route, le=str(bound)) + " %d" % count)
+                lines.append("http_request_duration_seconds_bucket"
+                             + labels(method=method, route=route, le="+Inf") + " %d" % histogram[-1])
+                lines.append("http_request_duration_seconds_sum"
+                             + labels(method=method, route=route) + " %.6f" % histogram[-2])
+                lines.append("http_request_duration_seconds_count"
+                             + labels(method=method, route=route) + " %d" % histogram[-1])
+
+            for i, (name, help) in enumerate(METRICS):
+                lines.append("# HELP " + name + "_total " + help)
+                lines.append("# TYPE " + name + "_total counter")
+                for (method, route), totals in sorted(self.totals.items()):
+                    value = totals[i]
+                    value = "%.6f" % value if isinstance(value, float) else "%d" % value
+                    lines.append(name + "_total" + labels(method=method, route=route) + " " + value)
+
+            lines.append("# HELP db_slow_statements_total Statements slower than SLOW_QUERY_MS.")
+            lines.append("# TYPE db_slow_statements_total counter")
+            lines.append("db_slow_statements_total %d" % self.slow_statements)
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def labels(**values):
+    escaped = []
+    for name, value in values.items():
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(name + '="' + value + '"')
+    return "{" + ",".join(escaped) + "}"
+
+def current_profile():
+    if has_app_context():
+        return g.get("profile")
+    return None
+
+def current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.method + " " + request.url_rule.rule
+    return None
+
+def slow_query_threshold():
+    value = os.getenv("SLOW_QUERY_MS")
+    return float(value) / 1000 if value else None
+
+SLOW_QUERY_SECONDS = slow_query_threshold()
+
+def start_slow_query_timer(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("slow_query_start", []).append(perf_counter())
+
+def log_slow_query(connection, cursor, statement, parameters, context, executemany):
+    seconds = perf_counter() - connection.info["slow_query_start"].pop()
+    if seconds >= SLOW_QUERY_SECONDS:
+        metrics.slow_statement()
+        logger.warning("slow query %.1fms on %s: %s", seconds * 1000, current_route() or "-",
+                       " ".join(statement.split()))
+
+def start_query_timer(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("query_start", []).append(perf_counter())
+
+def count_query(connection, cursor, statement, parameters, context, executemany):
+    seconds = perf_counter() - connection.info["query_start"].pop()
+    profile = current_profile()
+    if profile is not None:
+        profile["statements"] += 1
+        profile["db_seconds"] += seconds
+
+def count_row(target, context):
+    profile = current_profile()
+    if profile is not None:
+        profile["rows"] += 1
+
+def listen_once(target, identifier, fn, **kwargs):
+    # the listeners are process wide, creating a second app must not count everything twice
+    if not event.contains(target, identifier, fn):
+        event.listen(target, identifier, fn, **kwargs)
+
+def setup_slow_query_log():
+    if SLOW_QUERY_SECONDS is None:
+        return
+    listen_once(Engine, "before_cursor_execute", start_slow_query_timer)
+    listen_once(Engine, "after_cursor_execute", log_slow_query)
+
+def setup_profiling(app):
+    """
+    Registers the SQL and ORM listeners, the request hooks and GET /metrics on
+    the app. Nothing is installed when PROFILING is off.
+    """
+    listen_once(Engine, "before_cursor_execute", start_query_timer)
+    listen_once(Engine, "after_cursor_execute", count_query)
+    listen_once(db.Model, "load", count_row, propagate=True)
+
+    # time the provider's encoder, jsonify() and the NDJSON stream both go through it
+    dumps = app.json.dumps
+    def timed_dumps(obj, **kwargs):
+        start = perf_counter()
+        try:
+            return dumps(obj, **kwargs)
+        finally:
+            profile = current_profile()
+            if profile is not None:
+                profile["serialize_seconds"] += perf_counter() - start
+    app.json.dumps = timed_dumps
+
+    @app.before_request
+    def start_profile():
+        g.profile = {"start": perf_counter(), "statements": 0, "db_seconds": 0.0, "rows": 0,
+                     "serialize_seconds": 0.0}
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        seconds = perf_counter() - profile["start"]
+        response.headers["Server-Timing"] = ", ".join((
+            "app;dur=%.1f" % (seconds * 1000),
+            'db;dur=%.1f;desc="%d queries"' % (profile["db_seconds"] * 1000, profile["statements"]),
+            "serialize;dur=%.1f" % (profile["serialize_seconds"] * 1000),
+            'orm;desc="%d rows"' % profile["rows"],
+        ))
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe(request.method, route, response.status_code, seconds, profile)
+        return response
+
+    def handle_metrics():
+        return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+    app.add_url_rule("/metrics", "metrics", handle_metrics, methods=["GET"])
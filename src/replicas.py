@@ -0,0 +1,109 @@
+"""
+Optional read replicas, configured with DATABASE_READ_URL (one URL or a comma
+separated list).
+
+During GET and HEAD requests the session sends every read to one replica,
+picked round-robin per request so the ETag version and the data it describes
+come from the same database. Writes, flushes, other methods, the CLI and
+background threads always use DATABASE_URL. When the picked replica fails to
+connect, the request reads from the primary instead and the replica is skipped
+for REPLICA_RETRY_SECONDS; with none left, reads go to the primary. The async
+fast path in asgi.py follows the same rules with its own engines.
+
+Replicas lag behind the primary, so a successful POST/PUT/PATCH/DELETE sets a
+short lived cookie that keeps the client's reads on the primary for
+REPLICA_PIN_SECONDS, long enough for it to read its own write.
+"""
+import os
+import itertools
+from time import monotonic
+from flask import g, request, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.dml import UpdateBase
+
+READ_URLS = [url.strip().replace("postgres://", "postgresql://")
+             for url in os.getenv("DATABASE_READ_URL", "").split(",") if url.strip()]
+# the SQLALCHEMY_BINDS keys of the replicas
+REPLICA_KEYS = ["replica%d" % i for i in range(len(READ_URLS))]
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 5))
+REPLICA_RETRY_SECONDS = int(os.getenv("REPLICA_RETRY_SECONDS", 30))
+
+PIN_COOKIE = "read_primary"
+READ_METHODS = ("GET", "HEAD")
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+turns = itertools.count()
+down_until = {}
+
+def mark_down(key):
+    down_until[key] = monotonic() + REPLICA_RETRY_SECONDS
+
+def pick_replica():
+    # round robin over the replicas that did not fail recently
+    now = monotonic()
+    for _ in REPLICA_KEYS:
+        key = REPLICA_KEYS[next(turns) % len(REPLICA_KEYS)]
+        if down_until.get(key, 0) <= now:
+            return key
+    return None
+
+def read_bind():
+    """The replica this request reads from, None for the primary."""
+    if not REPLICA_KEYS or not has_request_context() or request.method not in READ_METHODS:
+        return None
+    if "read_bind" not in g:
+        g.read_bind = None if request.cookies.get(PIN_COOKIE) else pick_replica()
+    return g.read_bind
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            key = read_bind()
+            if key is not None:
+                engine = self._db.engines[key]
+                try:
+                    # connect before handing the engine out, so a dead replica costs a
+                    # fallback to the primary instead of the request; once connected
+                    # this returns the transaction's connection
+                    self.connection(bind_arguments={"bind": engine})
+                    return engine
+                except DBAPIError:
+                    mark_down(key)
+                    g.read_bind = None
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def replica_status(db):
+    status = {}
+    for key in REPLICA_KEYS:
+        try:
+            with db.engines[key].connect() as connection:
+                connection.execute(text("SELECT 1"))
+            status[key] = "ok"
+        except Exception as error:
+            status[key] = "error: " + type(error).__name__
+    return status
+
+def setup_replicas(app, db):
+    """
+    Marks replicas down when they fail to connect and pins writers to the
+    primary. Nothing is installed without DATABASE_READ_URL.
+    """
+    if not REPLICA_KEYS:
+        return
+    with app.app_context():
+        for key in REPLICA_KEYS:
+            listen_for_failures(key, db.engines[key])
+
+    @app.after_request
+    def pin_to_primary(response):
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, "1", max_age=REPLICA_PIN_SECONDS, httponly=True, samesite="Lax")
+        return response
+
+def listen_for_failures(key, engine):
+    @event.listens_for(engine, "handle_error")
+    def mark_failed(context):
+        if context.is_disconnect or context.connection is None:
+            mark_down(key)
@@ -0,0 +1,115 @@
+from flask import request
+from sqlalchemy import select
+from models import db, User, Favorites, Planets, Characters, Vehicles
+from pagination import keyset_page, next_page, MAX_PAGE_SIZE
+from utils import APIException, fits_int64
+
+# the columns serialize() returns, in the same order. Entities return id plus
+# their public_fields
+SERIALIZED_COLUMNS = {
+    User: ("id", "user_name", "email"),
+    Favorites: ("id", "user_id", "character_id", "planet_id", "vehicle_id"),
+}
+
+# the entity a favorite points at, by the name of its foreign key
+FAVORITE_ITEMS = (
+    ("planet", Planets),
+    ("character", Characters),
+    ("vehicle", Vehicles),
+)
+
+_columns = {}
+
+def model_columns(model):
+    if model not in _columns:
+        _columns[model] = SERIALIZED_COLUMNS.get(model) or ("id",) + model.public_fields
+    return _columns[model]
+
+def select_columns(model, fields=None, sort=()):
+    """
+    Returns the response keys and the table columns to SELECT for them. Sort
+    keys the client did not ask for are selected after the response keys, so
+    the cursor can be built from them and zip() leaves them out of the dict.
+    """
+    names = model_columns(model) if fields is None else ("id",) + tuple(fields)
+    table = model.__table__
+    columns = [table.c[name] for name in names]
+    for column, _ in sort or ():
+        if column.key not in names:
+            columns.append(table.c[column.key])
+    return names, columns
+
+def select_page(model, fields=None, criteria=(), sort=None):
+    """
+    The list endpoints' read path: a Core SELECT whose row tuples are zipped
+    straight into dicts, with no ORM identity map, instance state or
+    serialize() call per row. Returns the same body as page_response().
+    """
+    names, columns = select_columns(model, fields, sort)
+    statement, keys, limit = keyset_page(select(*columns).where(*criteria), model, sort)
+    rows, next_cursor = next_page(db.session.execute(statement).all(), keys, limit)
+    return {
+        "results": [dict(zip(names, row)) for row in rows],
+        "next": next_cursor,
+    }
+
+def requested_ids():
+    """
+    Parses ?ids=1,5,9 into a list of unique ids in request order, or None when
+    the parameter is missing.
+    """
+    raw = request.args.get("ids")
+    if raw is None:
+        return None
+    ids = []
+    seen = set()
+    for id in raw.split(","):
+        id = id.strip()
+        if not id:
+            continue
+        try:
+            id = int(id)
+        except ValueError:
+            raise APIException("ids must be a comma separated list of integers.", status_code=400)
+        if id < 0 or not fits_int64(id):
+            raise APIException("ids must be a comma separated list of integers.", status_code=400)
+        if id not in seen:
+            seen.add(id)
+            ids.append(id)
+    if len(ids) > MAX_PAGE_SIZE:
+        raise APIException("At most " + str(MAX_PAGE_SIZE) + " ids can be requested at once.", status_code=400)
+    return ids
+
+def select_ids(model, ids, fields=None, criteria=()):
+    """
+    Batch version of the detail routes: one SELECT ... WHERE id IN (...) for
+    every id. Results keep the order of `ids`, the ones that do not exist (or
+    do not match the filters) are listed under "missing".
+    """
+    names, columns = select_columns(model, fields)
+    found = {}
+    if ids:
+        statement = select(*columns).where(model.id.in_(ids), *criteria)
+        for row in db.session.execute(statement):
+            found[row[0]] = dict(zip(names, row))
+    return {
+        "results": [found[id] for id in ids if id in found],
+        "missing": [id for id in ids if id not in found],
+    }
+
+def expand_favorites(favorites):
+    """
+    Adds the favorited planet, character or vehicle to every favorite dict,
+    with at most one query per entity type however many favorites there are.
+    """
+    for type, model in FAVORITE_ITEMS:
+        ids = set(favorite[type + "_id"] for favorite in favorites)
+        ids.discard(None)
+        if not ids:
+            continue
+        items = select_ids(model, sorted(ids))["results"]
+        by_id = dict((item["id"], item) for item in items)
+        for favorite in favorites:
+            if favorite[type + "_id"] is not None:
+                favorite[type] = by_id.get(favorite[type + "_id"])
+    return favorites
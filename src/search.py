@@ -0,0 +1,108 @@
+import re
+from sqlalchemy import inspect, or_, text
+from models import db, Planets, Characters, Vehicles
+
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+# the SQLite FTS5 index stores every entity under rowid = id * 4 + code
+ENTITY_CODES = {1: "planet", 2: "character", 3: "vehicle"}
+
+# keep these expressions identical to the GIN indexes in the migration,
+# otherwise Postgres can not use them
+PLANET_DOCUMENT = "to_tsvector('simple', name)"
+CHARACTER_DOCUMENT = "to_tsvector('simple', name)"
+VEHICLE_DOCUMENT = "to_tsvector('simple', name || ' ' || model || ' ' || manufacturer)"
+
+POSTGRES_SEARCH = text("""
+    SELECT type, id, name, rank FROM (
+        SELECT 'planet' AS type, id, name, ts_rank(""" + PLANET_DOCUMENT + """, query) AS rank
+        FROM planets, to_tsquery('simple', :query) AS query
+        WHERE """ + PLANET_DOCUMENT + """ @@ query
+        UNION ALL
+        SELECT 'character' AS type, id, name, ts_rank(""" + CHARACTER_DOCUMENT + """, query) AS rank
+        FROM characters, to_tsquery('simple', :query) AS query
+        WHERE """ + CHARACTER_DOCUMENT + """ @@ query
+        UNION ALL
+        SELECT 'vehicle' AS type, id, name, ts_rank(""" + VEHICLE_DOCUMENT + """, query) AS rank
+        FROM vehicles, to_tsquery('simple', :query) AS query
+        WHERE """ + VEHICLE_DOCUMENT + """ @@ query
+    ) AS matches
+    ORDER BY rank DESC, type, id
+    LIMIT :limit
+""")
+
+# bm25 is smaller for better matches, a hit on name weighs more than model/manufacturer
+SQLITE_SEARCH = text("""
+    SELECT rowid, name, bm25(search_index, 10.0, 1.0, 1.0) AS rank
+    FROM search_index
+    WHERE search_index MATCH :query
+    ORDER BY rank
+    LIMIT :limit
+""")
+
+_has_fts_table = {}
+
+def search_terms(q):
+    # only keep word characters, the user input never reaches the query syntax
+    return re.findall(r"\w+", q.lower())
+
+def search(q, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    Ranks planets, characters and vehicles whose name (or model and
+    manufacturer for vehicles) starts with the words in `q`. Every word is a
+    prefix match, so it works for autocomplete as the user types.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return search_postgres(terms, limit)
+    if dialect == "sqlite" and has_fts_table():
+        return search_sqlite(terms, limit)
+    return search_like(terms, limit)
+
+def search_postgres(terms, limit):
+    query = " & ".join(term + ":*" for term in terms)
+    rows = db.session.execute(POSTGRES_SEARCH, {"query": query, "limit": limit})
+    results = []
+    for type, id, name, rank in rows:
+        results.append({"type": type, "id": id, "name": name, "rank": round(rank, 6)})
+    return results
+
+def search_sqlite(terms, limit):
+    query = " ".join('"' + term + '"*' for term in terms)
+    rows = db.session.execute(SQLITE_SEARCH, {"query": query, "limit": limit})
+    results = []
+    for rowid, name, rank in rows:
+        results.append({
+            "type": ENTITY_CODES[rowid % 4],
+            "id": rowid // 4,
+            "name": name,
+            "rank": round(-rank, 6),
+        })
+    return results
+
+def search_like(terms, limit):
+    # databases created without the migrations (db.create_all) have no full text index
+    pattern = " ".join(terms) + "%"
+    results = []
+    for type, model in (("planet", Planets), ("character", Characters), ("vehicle", Vehicles)):
+        criteria = [model.name.ilike(pattern)]
+        if model is Vehicles:
+            criteria += [Vehicles.model.ilike(pattern), Vehicles.manufacturer.ilike(pattern)]
+        rows = db.session.execute(
+            db.select(model.id, model.name).where(or_(*criteria)).order_by(model.name).limit(limit)
+        )
+        for id, name in rows:
+            rank = 1.0 if name.lower() == " ".join(terms) else 0.5
+            results.append({"type": type, "id": id, "name": name, "rank": rank})
+    results.sort(key=lambda result: -result["rank"])
+    return results[:limit]
+
+def has_fts_table():
+    url = str(db.engine.url)
+    if url not in _has_fts_table:
+        _has_fts_table[url] = inspect(db.engine).has_table("search_index")
+    return _has_fts_table[url]
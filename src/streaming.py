@@ -0,0 +1,36 @@
+import os
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import select
+from models import db
+from rows import select_columns
+
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 500))
+
+def wants_stream():
+    if request.args.get("stream") == "1":
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+def stream_collection(model, fields=None, criteria=(), sort=()):
+    """
+    Exports the whole table as NDJSON. Rows are read through a server side
+    cursor STREAM_CHUNK_SIZE at a time and every chunk is sent as soon as it
+    is serialized, so a worker never holds more than one chunk in memory.
+    """
+    def generate():
+        order = []
+        for column, descending in sort:
+            order.append(column.desc() if descending else column.asc())
+        order.append(model.id.desc() if sort and sort[-1][1] else model.id.asc())
+        names, columns = select_columns(model, fields, sort)
+        statement = select(*columns).where(*criteria).order_by(*order)
+        statement = statement.execution_options(yield_per=STREAM_CHUNK_SIZE)
+        result = db.session.execute(statement)
+        for partition in result.partitions():
+            lines = []
+            for row in partition:
+                lines.append(current_app.json.dumps(dict(zip(names, row))))
+            yield "\n".join(lines) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
@@ -0,0 +1,106 @@
+import os
+import json
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_, select
+from models import db, Planets, Characters, Vehicles
+from bulk import writable_columns, validate_record, parse_ndjson
+from database import dialect_insert
+from versions import bump_versions
+from cache import response_cache
+
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", 500))
+
+SYNC_MODELS = {
+    "planets": Planets,
+    "characters": Characters,
+    "vehicles": Vehicles,
+}
+
+def validate_records(model, records):
+    """
+    Returns the valid rows and one {"index", "errors"} entry per invalid record.
+    """
+    columns = writable_columns(model)
+    rows = []
+    failures = []
+    for index, record in enumerate(records):
+        row, errors = validate_record(columns, record)
+        if errors:
+            failures.append({"index": index, "errors": errors})
+        else:
+            rows.append(row)
+    return rows, failures
+
+def upsert_batch(table, columns, rows):
+    """
+    One INSERT ... ON CONFLICT (url) DO UPDATE for the batch. Rows whose values
+    did not change are skipped by the WHERE clause, so they are neither
+    written nor returned. Returns the urls that were inserted or updated.
+    """
+    statement = dialect_insert(table).values(rows)
+    updated_columns = [column.name for column in columns if column.name != "url"]
+    values = dict((name, statement.excluded[name]) for name in updated_columns)
+    values["updated_at"] = func.now()
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.url],
+        set_=values,
+        where=or_(*[table.c[name].is_distinct_from(statement.excluded[name]) for name in updated_columns]),
+    ).returning(table.c.url)
+    return set(db.session.scalars(statement))
+
+def sync_rows(model, rows):
+    """
+    Upserts validated rows keyed on their SWAPI url in batches of
+    SYNC_BATCH_SIZE, in the caller's transaction. Re-running the same import
+    only reads: every row comes back as unchanged.
+    """
+    table = model.__table__
+    columns = writable_columns(model)
+    # the last record wins when a url is repeated, a statement can not update a row twice
+    unique = dict((row["url"], row) for row in rows)
+    rows = list(unique.values())
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    for start in range(0, len(rows), SYNC_BATCH_SIZE):
+        batch = rows[start:start + SYNC_BATCH_SIZE]
+        urls = [row["url"] for row in batch]
+        existing = set(db.session.scalars(select(table.c.url).where(table.c.url.in_(urls))))
+        written = upsert_batch(table, columns, batch)
+        counts["inserted"] += len(written - existing)
+        counts["updated"] += len(written & existing)
+        counts["unchanged"] += len(batch) - len(written)
+
+    # Core statements are invisible to the session events, bump the ETags by hand
+    if counts["inserted"] or counts["updated"]:
+        bump_versions(db.session.connection(), [table.name])
+    return counts
+
+def sync(entity, records):
+    """
+    Validates and upserts records for the /<entity>/sync routes and the
+    `flask sync` command. Returns the counts and the invalid records.
+    """
+    model = SYNC_MODELS[entity]
+    rows, failures = validate_records(model, records)
+    try:
+        counts = sync_rows(model, rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if counts["inserted"] or counts["updated"]:
+        response_cache.invalidate_collection(entity)
+    counts["failed"] = len(failures)
+    counts["errors"] = failures
+    return counts
+
+@click.command("sync")
+@click.argument("entity", type=click.Choice(sorted(SYNC_MODELS)))
+@click.argument("file", type=click.File("r"))
+@with_appcontext
+def sync_command(entity, file):
+    """Upserts a JSON array or NDJSON file of SWAPI records keyed on url."""
+    text = file.read()
+    records = json.loads(text) if text.lstrip().startswith("[") else parse_ndjson(text)
+    click.echo(json.dumps(sync(entity, records), indent=2))
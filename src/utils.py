@@ -1,4 +1,6 @@
-from flask import jsonify, url_for
+import zlib
+from flask import jsonify, make_response, request, url_for
+from compression import negotiated_encoding
 
 class APIException(Exception):
     status_code = 400
@@ -15,23 +17,36 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+# SQLite and Postgres integers are 64 bit, binding anything larger fails in the driver
+MIN_INT64 = -2 ** 63
+MAX_INT64 = 2 ** 63 - 1
+
+def fits_int64(value):
+    return MIN_INT64 <= value <= MAX_INT64
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
-def generate_sitemap(app):
-    links = ['/admin/']
-    for rule in app.url_map.iter_rules():
+def route_count(app):
+    return sum(1 for _ in app.url_map.iter_rules())
+
+def build_sitemap(app):
+    links = ['/admin/'] if 'admin' in app.blueprints else []
+    routes = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
         if "GET" in rule.methods and has_no_empty_params(rule):
             url = url_for(rule.endpoint, **(rule.defaults or {}))
             if "/admin/" not in url:
                 links.append(url)
+        if not rule.rule.startswith("/admin/") and rule.endpoint != "static":
+            routes.append({"rule": rule.rule, "methods": sorted(rule.methods - {"HEAD", "OPTIONS"})})
 
     links_html = "".join(["<li><a href='" + y + "'>" + y + "</a></li>" for y in links])
-    return """
+    html = """
         <div style="text-align: center;">
         <img style="max-height: 80px" src='https://storage.googleapis.com/breathecode/boilerplates/rigo-baby.jpeg' />
         <h1>Rigo welcomes you to your API!!</h1>
@@ -39,3 +54,39 @@ def generate_sitemap(app):
         <p>Start working on your proyect by following the <a href="https://start.4geeksacademy.com/starters/flask" target="_blank">Quick Start</a></p>
         <p>Remember to specify a real endpoint path like: </p>
         <ul style="text-align: left;">"""+links_html+"</ul></div>"
+    json_body = app.json.dumps({"links": links, "routes": routes}, separators=(",", ":"))
+    return {
+        "rules": route_count(app),
+        "html": html,
+        "json": json_body,
+        "etag": format(zlib.crc32((html + json_body).encode()), "x"),
+    }
+
+def generate_sitemap(app):
+    """
+    The sitemap is built on the first request and kept on the app, it only
+    changes when routes are added, which Flask only allows before the first
+    request anyway. Counting the rules is enough to notice it.
+    """
+    sitemap = app.extensions.get("sitemap")
+    if sitemap is None or sitemap["rules"] != route_count(app):
+        sitemap = build_sitemap(app)
+        app.extensions["sitemap"] = sitemap
+    return sitemap
+
+def sitemap_response(app):
+    # / is hit by the load balancer health checks, they get a 304 or a prebuilt body
+    sitemap = generate_sitemap(app)
+    wants_json = request.args.get("format") == "json" or \
+        request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json"
+    if wants_json:
+        response = make_response(sitemap["json"])
+        response.mimetype = "application/json"
+        # JSON responses may be compressed, each encoding needs its own strong ETag
+        etag = sitemap["etag"] + "-json-" + (negotiated_encoding() or "identity")
+    else:
+        response = make_response(sitemap["html"])
+        etag = sitemap["etag"] + "-html"
+    response.set_etag(etag)
+    response.vary.add("Accept")
+    return response.make_conditional(request)
@@ -0,0 +1,133 @@
+import zlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import g, make_response, request
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from werkzeug.http import is_resource_modified
+from models import db, TableVersion
+from streaming import wants_stream
+from compression import negotiated_encoding
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def bump_versions(connection, table_names):
+    now = utcnow()
+    # sorted so concurrent transactions always lock the version rows in the same order
+    for table_name in sorted(table_names):
+        result = connection.execute(
+            update(TableVersion.__table__)
+            .where(TableVersion.table_name == table_name)
+            .values(version=TableVersion.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                insert(TableVersion.__table__)
+                .values(table_name=table_name, version=1, updated_at=now)
+            )
+
+@event.listens_for(Session, "after_flush")
+def track_flushed_tables(session, flush_context):
+    # new/dirty/deleted still describe what was just flushed at this point
+    table_names = set()
+    for instance in list(session.new) + list(session.deleted):
+        table_names.add(instance.__table__.name)
+    for instance in session.dirty:
+        if session.is_modified(instance):
+            table_names.add(instance.__table__.name)
+    table_names.discard(TableVersion.__tablename__)
+    if table_names:
+        bump_versions(session.connection(), table_names)
+
+@event.listens_for(Session, "do_orm_execute")
+def track_bulk_writes(orm_execute_state):
+    # insert(Model)/update(Model)/delete(Model) statements skip the flush entirely
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.local_table is not TableVersion.__table__:
+        bump_versions(orm_execute_state.session.connection(), [mapper.local_table.name])
+
+def versions_query(table_names):
+    return (
+        select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.table_name.in_(table_names))
+    )
+
+def combine_versions(table_names, rows):
+    """(version string, newest updated_at) from the versions_query() rows."""
+    versions = {}
+    last_modified = None
+    for table_name, version, updated_at in rows:
+        versions[table_name] = version
+        if last_modified is None or updated_at > last_modified:
+            last_modified = updated_at
+    parts = []
+    for table_name in table_names:
+        parts.append(table_name + "." + str(versions.get(table_name, 0)))
+    return "-".join(parts), last_modified
+
+def read_versions(models):
+    table_names = [model.__table__.name for model in models]
+    return combine_versions(table_names, db.session.execute(versions_query(table_names)).all())
+
+def hash_variant(query_string, stream, encoding):
+    # the body also depends on the query string (cursor, limit, fields...), on the format
+    # and on the content encoding, a gzip and a plain body must not share a strong ETag
+    variant = "&".join(sorted(query_string.split("&")))
+    if stream:
+        variant += "#ndjson"
+    if encoding is not None:
+        variant += "#" + encoding
+    return format(zlib.crc32(variant.encode()), "x")
+
+def variant_hash():
+    return hash_variant(request.query_string.decode(), wants_stream(), negotiated_encoding())
+
+def collection_validators(models):
+    version, last_modified = read_versions(models)
+    return version + "-" + variant_hash(), last_modified
+
+def item_validators(model, id):
+    updated_at = db.session.execute(
+        select(model.updated_at).where(model.id == id)
+    ).scalar()
+    if updated_at is None:
+        return None, None
+    version, _ = read_versions([model])
+    return version + "-" + str(id) + "-" + variant_hash(), updated_at
+
+def versioned(*models, collection=False):
+    """
+    Adds a strong ETag and Last-Modified to successful GET responses and
+    answers If-None-Match / If-Modified-Since with a 304 before the view runs.
+    The ETag is derived from the table version counters, never from the body.
+    Routes with a view argument are treated as detail routes of models[0],
+    unless collection=True (e.g. a listing nested under a parent id).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+            if kwargs and not collection:
+                etag, last_modified = item_validators(models[0], list(kwargs.values())[0])
+            else:
+                etag, last_modified = collection_validators(models)
+            if etag is None:
+                return view(*args, **kwargs)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response("", 304)
+            else:
+                g.etag = etag
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+            return response
+        return wrapper
+    return decorator